@@ -1,6 +1,9 @@
 import cv2
 import numpy as np
 import os
+import queue
+import threading
+import time
 from datetime import datetime
 
 class ArUcoDetectionSystem:
@@ -30,6 +33,12 @@ class ArUcoDetectionSystem:
                 self.aruco_dict = cv2.aruco.Dictionary(cv2.aruco.DICT_4X4_50)
                 self.aruco_params = cv2.aruco.DetectorParameters_create()
         
+        # 検出器は作り直さずに使い回す（ストリーミングでは検出スレッドだけが使う）
+        try:
+            self.detector = cv2.aruco.ArucoDetector(self.aruco_dict, self.aruco_params)
+        except AttributeError:
+            self.detector = None
+        
         # 写真保存用のディレクトリ
         self.photo_dir = "captured_photos"
         if not os.path.exists(self.photo_dir):
@@ -136,6 +145,192 @@ class ArUcoDetectionSystem:
         
         return detected_count, image
     
+    def detect_markers_in_frame(self, frame):
+        """
+        メモリ上のフレームからArUcoマーカーを検出（ファイルへの保存・読み込みなし）
+        
+        Args:
+            frame (numpy.ndarray): カメラから取得したBGR画像
+        
+        Returns:
+            tuple: (検出されたマーカー数, コーナー座標, マーカーID)
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.detector is not None:
+            corners, ids, rejected = self.detector.detectMarkers(gray)
+        else:
+            corners, ids, rejected = cv2.aruco.detectMarkers(
+                gray, self.aruco_dict, parameters=self.aruco_params
+            )
+        return (len(ids) if ids is not None else 0), corners, ids
+    
+    def open_capture(self, source=0):
+        """
+        カメラ（ID）または動画ファイル（パス）を開く
+        """
+        if isinstance(source, int):
+            cap = cv2.VideoCapture(source, cv2.CAP_DSHOW)
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        else:
+            cap = cv2.VideoCapture(source)
+        return cap
+    
+    def run_stream(self, source=0, stable_frames=5, timeout=30.0, show_preview=True, save_photo=True):
+        """
+        カメラ映像のフレームをそのまま連続で検出する（撮影→保存→読み込み→検出を待たない）
+        
+        撮影スレッドは常に最新の1フレームだけを受け渡し用のキューに置き、検出が追いつかない間の
+        フレームは捨てる（検出にかかる時間に応じて自動的に間引かれる）。検出スレッドは
+        目標数のマーカーが同じIDのまま stable_frames フレーム続いたら判定を確定して終了する。
+        
+        Args:
+            source (int | str): カメラID、または動画ファイルのパス（動画は撮影時のfpsで再生）
+            stable_frames (int): 判定を確定するまでに安定して検出が続く必要があるフレーム数
+            timeout (float): この秒数で確定しなければ終了する
+            show_preview (bool): プレビューウィンドウを表示するか（ESCで中断）
+            save_photo (bool): 確定したフレームと結果画像を captured_photos に保存するか
+        
+        Returns:
+            dict: 判定結果とフレーム数の統計
+        """
+        cap = self.open_capture(source)
+        if not cap.isOpened():
+            print("カメラが開けませんでした")
+            return {"ArUco_check": 0, "error": "Camera open failed"}
+        
+        # 動画ファイルは実時間で流す（カメラは read() が次のフレームまで待つ）
+        frame_interval = 0.0
+        if not isinstance(source, int):
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+        
+        frames = queue.Queue(maxsize=1)  # 最新のフレームだけを保持する受け渡し口
+        stop = threading.Event()
+        done = threading.Event()
+        lock = threading.Lock()
+        stats = {"captured": 0, "processed": 0, "skipped": 0}
+        state = {"stable": 0, "last_ids": None, "frame": None, "corners": None, "ids": None, "count": 0}
+        
+        def capture_loop():
+            next_time = time.perf_counter()
+            while not stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                with lock:
+                    stats["captured"] += 1
+                try:
+                    frames.put_nowait(frame)
+                except queue.Full:
+                    # 検出が追いついていない: 古いフレームを捨てて最新に差し替える
+                    try:
+                        frames.get_nowait()
+                        with lock:
+                            stats["skipped"] += 1
+                    except queue.Empty:
+                        pass
+                    frames.put_nowait(frame)
+                if frame_interval:
+                    next_time += frame_interval
+                    time.sleep(max(0.0, next_time - time.perf_counter()))
+            stop.set()
+        
+        def detect_loop():
+            while not done.is_set():
+                try:
+                    frame = frames.get(timeout=0.1)
+                except queue.Empty:
+                    if stop.is_set():
+                        break
+                    continue
+                count, corners, ids = self.detect_markers_in_frame(frame)
+                id_set = tuple(sorted(ids.flatten().tolist())) if ids is not None else ()
+                with lock:
+                    stats["processed"] += 1
+                    if count == self.ArUco_num and id_set == state["last_ids"]:
+                        state["stable"] += 1
+                    else:
+                        state["stable"] = 1 if count == self.ArUco_num else 0
+                    state.update(last_ids=id_set, frame=frame, corners=corners, ids=ids, count=count)
+                    if state["stable"] >= stable_frames:
+                        done.set()
+        
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=capture_loop, name="aruco-capture", daemon=True),
+            threading.Thread(target=detect_loop, name="aruco-detect", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+        
+        print(f"ストリーミング検出中（目標 {self.ArUco_num} 個が {stable_frames} フレーム続いたら確定、ESCで中断）")
+        aborted = False
+        while not done.is_set() and not (stop.is_set() and not threads[1].is_alive()):
+            if time.perf_counter() - start > timeout:
+                print("時間内に確定できませんでした")
+                break
+            if show_preview:
+                with lock:
+                    frame, corners, ids, count = state["frame"], state["corners"], state["ids"], state["count"]
+                if frame is not None:
+                    preview = frame.copy()
+                    if ids is not None:
+                        cv2.aruco.drawDetectedMarkers(preview, corners, ids)
+                    cv2.putText(preview, f"{count}/{self.ArUco_num}", (20, 40),
+                                cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0) if count == self.ArUco_num else (0, 0, 255), 2)
+                    cv2.imshow('Camera Preview', preview)
+                if cv2.waitKey(1) & 0xFF == 27:  # ESCキーで中断
+                    aborted = True
+                    break
+            else:
+                done.wait(0.05)
+        
+        confirmed = done.is_set()
+        stop.set()
+        done.set()
+        for t in threads:
+            t.join(timeout=2)
+        cap.release()
+        if show_preview:
+            cv2.destroyAllWindows()
+        elapsed = time.perf_counter() - start
+        
+        with lock:
+            frame, corners, ids, count = state["frame"], state["corners"], state["ids"], state["count"]
+            result = {
+                "ArUco_check": 1 if confirmed else 0,
+                "detected_count": count,
+                "target_count": self.ArUco_num,
+                "marker_ids": list(state["last_ids"] or ()),
+                "elapsed": round(elapsed, 3),
+                "frames_captured": stats["captured"],
+                "frames_processed": stats["processed"],
+                "frames_skipped": stats["skipped"],
+            }
+        if aborted:
+            result["error"] = "Aborted"
+        
+        if confirmed:
+            print(f"✓ 条件を満たしました: {count} 個のマーカーが {stable_frames} フレーム安定（{elapsed:.2f} 秒）")
+        else:
+            print(f"✗ 条件を満たしませんでした: 確定前に終了（最後の検出数 {count} / 設定数 {self.ArUco_num}）")
+        self.ArUco_check = result["ArUco_check"]
+        
+        # 判定を確定した後で保存するので、応答の速さには影響しない
+        if save_photo and frame is not None:
+            existing_photos = [f for f in os.listdir(self.photo_dir) if f.startswith('pic') and f.endswith('.jpg')]
+            filename = f"pic{len(existing_photos) + 1}.jpg"
+            cv2.imwrite(os.path.join(self.photo_dir, filename), frame)
+            annotated = frame.copy()
+            if ids is not None:
+                cv2.aruco.drawDetectedMarkers(annotated, corners, ids)
+            cv2.imwrite(os.path.join(self.photo_dir, f"result_{filename}"), annotated)
+            result["processed_image"] = filename
+            result["result_image"] = f"result_{filename}"
+        
+        return result
+    
     def check_aruco_condition(self, detected_count):
         """
         検出されたArUcoマーカー数が設定値と一致するかチェック
@@ -222,13 +417,23 @@ class ArUcoDetectionSystem:
         
         return result
 
+# ========== 設定項目 ==========
+# "stream": カメラ映像を連続で検出し、安定したら確定 / "photo": スペースキーで撮影→保存→検出
+CAPTURE_MODE = "stream"
+STABLE_FRAMES = 5  # 確定までに同じマーカーが続く必要があるフレーム数
+# =============================
+
 # 使用例
 if __name__ == "__main__":
     # システムを初期化（ArUcoマーカーを2個検出したい場合）
     detector = ArUcoDetectionSystem(target_aruco_num=2)
     
-    # 完全なプロセスを実行
-    result = detector.run_full_process()
+    if CAPTURE_MODE == "stream":
+        # ストリーミング検出を実行
+        result = detector.run_stream(stable_frames=STABLE_FRAMES)
+    else:
+        # 完全なプロセスを実行
+        result = detector.run_full_process()
     
     # 結果を表示
     print("\n=== 最終結果 ===")
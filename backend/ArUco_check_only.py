@@ -4,160 +4,544 @@ import os
 import cv2
 import numpy as np
 import json
-from datetime import datetime
-import glob
+import threading
+import time
+import base64
+import mimetypes
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from aruco_detectors import DEFAULT_DICTIONARY, detect_markers, get_config
+from aruco_batch import detect_folder, summarize
+from result_writer import render_result_image
+from image_index import get_image_index
 
 # ========== Firebase Initialization ==========
 
+FIREBASE_STORAGE_BUCKET = 'e-bike-maizuru.firebasestorage.app'
 
-cred_json = os.environ.get("FIREBASE_CREDENTIALS_JSON")
-cred_dict = json.loads(cred_json)
-cred = credentials.Certificate(cred_dict)
-# cred = credentials.Certificate("serviceAccountKey.json")
-# Initialize Firebase app
-firebase_admin.initialize_app(cred, {
-    'storageBucket': 'e-bike-maizuru.firebasestorage.app'
-})
+# Set FIREBASE_BUCKET_DIR to use a local folder instead of Firebase Storage
+# (offline runs and load tests). FIREBASE_BUCKET_LATENCY adds a delay per call.
+FIREBASE_BUCKET_DIR = os.environ.get("FIREBASE_BUCKET_DIR")
+FIREBASE_BUCKET_LATENCY = float(os.environ.get("FIREBASE_BUCKET_LATENCY", 0))
 
-# ========== Firebase Image Download Helper ==========
-
-def download_firebase_images(local_folder="captured_photos", firebase_folder="uploads"):
-    bucket = fb_storage.bucket()
-    blobs = bucket.list_blobs(prefix=firebase_folder + "/")
-    downloaded_count = 0
+_firebase_lock = threading.Lock()
 
-    if not os.path.exists(local_folder):
-        os.makedirs(local_folder)
 
-    for blob in blobs:
-        if blob.name.endswith("/"):
-            continue  # Skip folders
-        filename = os.path.basename(blob.name)
-        local_path = os.path.join(local_folder, filename)
+def init_firebase():
+    with _firebase_lock:
+        try:
+            firebase_admin.get_app()
+            return
+        except ValueError:
+            pass
+        cred_json = os.environ.get("FIREBASE_CREDENTIALS_JSON")
+        cred_dict = json.loads(cred_json)
+        cred = credentials.Certificate(cred_dict)
+        # cred = credentials.Certificate("serviceAccountKey.json")
+        # Initialize Firebase app
+        firebase_admin.initialize_app(cred, {
+            'storageBucket': FIREBASE_STORAGE_BUCKET
+        })
+
+
+# ========== Local Bucket (stand-in for Firebase Storage) ==========
+
+class LocalBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        path = bucket.path(name)
+        st = os.stat(path)
+        self.size = st.st_size
+        self.updated = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+        self.generation = st.st_mtime_ns
+        self._md5_hash = None
+
+    @property
+    def md5_hash(self):
+        # Same format as google.cloud.storage: base64 of the raw MD5 digest
+        if self._md5_hash is None:
+            with open(self.bucket.path(self.name), "rb") as f:
+                self._md5_hash = base64.b64encode(hashlib.md5(f.read()).digest()).decode("ascii")
+        return self._md5_hash
+
+    @property
+    def content_type(self):
+        return mimetypes.guess_type(self.name)[0] or "application/octet-stream"
+
+    def download_as_bytes(self):
+        self.bucket.wait()
+        with open(self.bucket.path(self.name), "rb") as f:
+            return f.read()
+
+    def download_to_filename(self, filename):
+        with open(filename, "wb") as dst:
+            dst.write(self.download_as_bytes())
+
+
+class LocalBucket:
+    """Folder-backed bucket with the subset of the google.cloud.storage API we use"""
+
+    def __init__(self, root, latency=0.0):
+        self.root = root
+        self.latency = latency
+        self.name = f"local:{root}"
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split("/"))
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_blob(self, name):
+        self.wait()
+        if not os.path.isfile(self.path(name)):
+            return None
+        return LocalBlob(self, name)
+
+    def list_blobs(self, prefix="", start_offset=None, delimiter=None):
+        self.wait()
+        blobs = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+                if not rel.startswith(prefix) or (start_offset is not None and rel < start_offset):
+                    continue
+                if delimiter and delimiter in rel[len(prefix):]:
+                    continue  # in a "subfolder" (GCS returns these as prefixes)
+                blobs.append(LocalBlob(self, rel))
+        blobs.sort(key=lambda b: b.name)
+        return blobs
+
+
+def get_bucket():
+    if FIREBASE_BUCKET_DIR:
+        return LocalBucket(FIREBASE_BUCKET_DIR, latency=FIREBASE_BUCKET_LATENCY)
+    init_firebase()
+    return fb_storage.bucket()
 
-        if os.path.exists(local_path):
-            print(f"Already downloaded: {filename}")
-            continue
+# ========== Firebase Image Download Helper ==========
 
-        print(f"Downloading: {filename}")
-        blob.download_to_filename(local_path)
-        downloaded_count += 1
+# The web app uploads as "uploads/<Date.now()>_<file name>", so blob names sort by
+# upload time. The manifest keeps the last name seen as a checkpoint and the next
+# sync only lists names from there (start_offset). A full listing still runs every
+# FIREBASE_FULL_SYNC_INTERVAL seconds to pick up blobs that don't follow that scheme.
+# Only direct children of the folder are listed (delimiter="/"): per-bike uploads in
+# "uploads/<bikeId>/" sort after every "uploads/<Date.now()>_..." name and would
+# otherwise pin the checkpoint past all later top-level uploads.
+MANIFEST_FILENAME = ".firebase_manifest.json"
+FIREBASE_SYNC_WORKERS = int(os.environ.get("FIREBASE_SYNC_WORKERS", 8))
+FIREBASE_FULL_SYNC_INTERVAL = int(os.environ.get("FIREBASE_FULL_SYNC_INTERVAL", 3600))
+
+_sync_locks = {}
+_sync_locks_guard = threading.Lock()
+
+
+def _sync_lock(local_folder):
+    key = os.path.abspath(local_folder)
+    with _sync_locks_guard:
+        return _sync_locks.setdefault(key, threading.Lock())
+
+
+def load_manifest(local_folder):
+    try:
+        with open(os.path.join(local_folder, MANIFEST_FILENAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"checkpoint": None, "last_full_sync": 0, "blobs": {}}
+
+
+def save_manifest(local_folder, manifest):
+    path = os.path.join(local_folder, MANIFEST_FILENAME)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _download_blob(blob, local_path):
+    tmp_path = f"{local_path}.{os.getpid()}.{threading.get_ident()}.part"
+    blob.download_to_filename(tmp_path)
+    os.replace(tmp_path, local_path)
+    if blob.updated is not None:
+        # Downloads finish in any order; the image index picks the latest by mtime,
+        # so stamp each file with its upload time instead of its download time
+        ts = blob.updated.timestamp()
+        os.utime(local_path, (ts, ts))
+    return local_path
+
+
+def _manifest_entry(blob):
+    return {
+        "generation": blob.generation,
+        "updated": blob.updated.isoformat() if blob.updated else None,
+        "md5": blob.md5_hash,
+        "size": blob.size,
+    }
+
+
+def download_firebase_images(local_folder="captured_photos", firebase_folder="uploads", full=False):
+    """Sync new or changed blobs into local_folder and return the paths downloaded"""
+    if not os.path.exists(local_folder):
+        os.makedirs(local_folder)
 
-    print(f"\n✅ Download complete. Total new files downloaded: {downloaded_count}")
+    with _sync_lock(local_folder):
+        manifest = load_manifest(local_folder)
+        prefix = firebase_folder + "/"
+        checkpoint = manifest.get("checkpoint")
+        full = (full or checkpoint is None or not checkpoint.startswith(prefix)
+                or "/" in checkpoint[len(prefix):]
+                or time.time() - manifest.get("last_full_sync", 0) > FIREBASE_FULL_SYNC_INTERVAL)
+
+        bucket = get_bucket()
+        if full:
+            checkpoint = None  # recomputed from the full listing
+            blobs = bucket.list_blobs(prefix=prefix, delimiter="/")
+        else:
+            blobs = bucket.list_blobs(prefix=prefix, start_offset=checkpoint, delimiter="/")
+
+        known = manifest["blobs"]
+        pending = []
+        for blob in blobs:
+            if blob.name.endswith("/"):
+                continue  # Skip folders
+            if checkpoint is None or blob.name > checkpoint:
+                checkpoint = blob.name
+            local_path = os.path.join(local_folder, os.path.basename(blob.name))
+            entry = known.get(blob.name)
+            if entry is None and os.path.exists(local_path) and os.path.getsize(local_path) == blob.size:
+                # Downloaded before the manifest existed
+                entry = known[blob.name] = _manifest_entry(blob)
+            if entry is not None and entry["generation"] == blob.generation and (not full or os.path.exists(local_path)):
+                continue
+            pending.append((blob, local_path))
+
+        downloaded = []
+        failed = []
+        if pending:
+            print(f"Downloading {len(pending)} new file(s)")
+            with ThreadPoolExecutor(max_workers=max(1, min(FIREBASE_SYNC_WORKERS, len(pending)))) as pool:
+                futures = {pool.submit(_download_blob, blob, path): blob for blob, path in pending}
+                for future in as_completed(futures):
+                    blob = futures[future]
+                    try:
+                        downloaded.append(future.result())
+                    except Exception as e:
+                        print(f"Failed to download {blob.name}: {e}")
+                        failed.append(blob.name)
+                        continue
+                    known[blob.name] = _manifest_entry(blob)
+
+        if failed:
+            # start_offset is inclusive, so the next sync lists the failed blobs again
+            checkpoint = min(failed)
+        manifest["checkpoint"] = checkpoint
+        if full:
+            manifest["last_full_sync"] = time.time()
+        if pending or full:
+            save_manifest(local_folder, manifest)
+
+    index = get_image_index(local_folder)
+    for path in downloaded:
+        index.add(path)
+
+    print(f"\n✅ Download complete. Total new files downloaded: {len(downloaded)}")
+    return downloaded
+
+# ========== Latest Upload (in memory) ==========
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Name of the newest blob seen so far, per bucket/prefix. Like the sync checkpoint,
+# later lookups only list names from there; a full listing runs every
+# FIREBASE_FULL_SYNC_INTERVAL seconds. Only direct children of the folder count,
+# so "uploads/<bikeId>/..." never becomes the hint for "uploads/".
+_latest_hints = {}
+_latest_hints_lock = threading.Lock()
+
+
+def find_latest_blob(bucket, firebase_folder="uploads"):
+    prefix = firebase_folder + "/"
+    key = (bucket.name, prefix)
+    with _latest_hints_lock:
+        hint, listed_at = _latest_hints.get(key, (None, 0))
+
+    blobs = []
+    if hint is not None and time.time() - listed_at <= FIREBASE_FULL_SYNC_INTERVAL:
+        blobs = list(bucket.list_blobs(prefix=prefix, start_offset=hint, delimiter="/"))
+        full_listed_at = listed_at
+    if not blobs:
+        blobs = list(bucket.list_blobs(prefix=prefix, delimiter="/"))
+        full_listed_at = time.time()
+
+    images = [b for b in blobs if b.name.lower().endswith(IMAGE_EXTENSIONS)]
+    if not images:
+        return None
+    latest = max(images, key=lambda b: (b.updated, b.name))
+    with _latest_hints_lock:
+        _latest_hints[key] = (max(b.name for b in images), full_listed_at)
+    return latest
+
+
+def detect_blob(detector, blob, save_result=None):
+    """Run detection on one blob in memory (not even downloaded when its result is cached)"""
+    result = detector.process_blob(blob, save_result=save_result)
+    print(f"\nResult: {result}")
+    return result
+
+
+def detect_latest_upload(detector, firebase_folder="uploads", save_result=None):
+    """Run detection on the newest upload without writing it to local disk"""
+    blob = find_latest_blob(get_bucket(), firebase_folder)
+    if blob is None:
+        print("No images found.")
+        return None
+    return detect_blob(detector, blob, save_result=save_result)
+
+# ========== Detection Result Cache Keys ==========
+# Riders tap "check" several times on the same photo. Results are cached by what
+# identifies the image contents without decoding it: the MD5 that Firebase keeps
+# in the blob metadata, the MD5 of bytes already in memory (same format, so both
+# share entries), or the path, mtime and size of a local file.
+
+def bytes_content_key(data):
+    return "md5:" + base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+
+
+def blob_content_key(blob):
+    md5_hash = getattr(blob, "md5_hash", None)
+    if md5_hash:
+        return f"md5:{md5_hash}"
+    return f"blob:{blob.name}#{blob.generation}"
+
+
+def file_content_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"file:{os.path.abspath(path)}#{st.st_mtime_ns}#{st.st_size}"
 
 # ========== ArUco Detection Class (your existing) ==========
 
 class ArUcoImageDetectionSystem:
-    def __init__(self, target_aruco_num=1, image_folder="images"):
+    def __init__(self, target_aruco_num=1, image_folder="images",
+                 dictionary_id=DEFAULT_DICTIONARY, detector_params=None, coarse_max_side=None,
+                 save_results=True, result_writer=None, pose_estimator=None,
+                 result_cache=None, gray_cache=None):
         self.ArUco_num = target_aruco_num
         self.ArUco_check = 0
         self.image_folder = image_folder
 
-        try:
-            self.aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
-            self.aruco_params = cv2.aruco.DetectorParameters()
-        except AttributeError:
-            self.aruco_dict = cv2.aruco.Dictionary_get(cv2.aruco.DICT_4X4_50)
-            self.aruco_params = cv2.aruco.DetectorParameters_create()
-
+        # Shared per process; see aruco_detectors.py
+        self.dictionary_id = dictionary_id
+        self.detector_params = detector_params
+        self.aruco_dict, self.aruco_params = get_config(dictionary_id, detector_params)
+        # Long side of the coarse pass for large photos (None: always full resolution)
+        self.coarse_max_side = coarse_max_side
+
+        # Write annotated result_* images (can be overridden per call). With a
+        # result_writer (see result_writer.py) they are written on its background thread.
+        self.save_results = save_results
+        self.result_writer = result_writer
         self.result_dir = "detection_results"
+        # Optional pose stage on the detected corners (see aruco_pose.py)
+        self.pose_estimator = pose_estimator
+
+        # Optional caches keyed by image contents (see the cache keys above):
+        # result_cache is a result_cache.SingleFlightCache of result dicts, gray_cache
+        # a result_cache.ArrayLRU of decoded grayscale images
+        self.result_cache = result_cache
+        self.gray_cache = gray_cache
         if not os.path.exists(self.result_dir):
             os.makedirs(self.result_dir)
 
     def get_image_files(self):
-        extensions = ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']
-        image_files = []
-        for ext in extensions:
-            image_files.extend(glob.glob(os.path.join(self.image_folder, ext)))
-        image_files.sort()
-        return image_files
+        return get_image_index(self.image_folder).files()
 
     def get_latest_image_file(self):
-        image_files = self.get_image_files()
-        if not image_files:
-            return None
-        latest_file = max(image_files, key=os.path.getmtime)
-        return latest_file
+        # Kept ordered by mtime in image_index.py instead of globbing and stat-ing every file
+        return get_image_index(self.image_folder).latest()
 
     def detect_aruco_markers(self, image_path):
         image = cv2.imread(image_path)
         if image is None:
             print(f"Failed to load image: {image_path}")
             return 0, None, None
+        return self.detect_aruco_markers_in_image(image)
 
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    def find_markers(self, image):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-        try:
-            detector = cv2.aruco.ArucoDetector(self.aruco_dict, self.aruco_params)
-            corners, ids, _ = detector.detectMarkers(gray)
-        except AttributeError:
-            corners, ids, _ = cv2.aruco.detectMarkers(gray, self.aruco_dict, parameters=self.aruco_params)
-
-        detected_count = 0
-        marker_ids = None
+        corners, ids, _ = detect_markers(
+            gray, self.dictionary_id, self.detector_params,
+            max_side=self.coarse_max_side, min_markers=self.ArUco_num,
+        )
 
         if ids is not None:
-            detected_count = len(ids)
-            marker_ids = ids.flatten()
-            try:
-                cv2.aruco.drawDetectedMarkers(image, corners, ids)
-            except:
-                image = cv2.aruco.drawDetectedMarkers(image, corners, ids)
-
-            print(f"Detected {detected_count} ArUco markers: {marker_ids}")
+            print(f"Detected {len(ids)} ArUco markers: {ids.flatten()}")
         else:
             print("No ArUco markers detected.")
+        return corners, ids
 
-        return detected_count, image, marker_ids
+    def detect_aruco_markers_in_image(self, image):
+        corners, ids = self.find_markers(image)
+        if ids is None:
+            return 0, image, None
+        try:
+            cv2.aruco.drawDetectedMarkers(image, corners, ids)
+        except:
+            image = cv2.aruco.drawDetectedMarkers(image, corners, ids)
+        return len(ids), image, ids.flatten()
 
     def check_aruco_condition(self, detected_count):
+        # Return the local value: one instance may be shared by several request threads
         if detected_count == self.ArUco_num:
-            self.ArUco_check = 1
+            aruco_check = 1
             print(f"✓ Matched: detected {detected_count} = target {self.ArUco_num}")
         else:
-            self.ArUco_check = 0
+            aruco_check = 0
             print(f"✗ Not matched: detected {detected_count} ≠ target {self.ArUco_num}")
-        return self.ArUco_check
+        self.ArUco_check = aruco_check
+        return aruco_check
 
-    def process_image(self, image_path):
+    def process_image(self, image_path, save_result=None):
         print(f"\nProcessing image: {os.path.basename(image_path)}")
-        detected_count, result_image, marker_ids = self.detect_aruco_markers(image_path)
+
+        def load():
+            image = cv2.imread(image_path)
+            if image is None:
+                print(f"Failed to load image: {image_path}")
+            return image
+
+        return self._process_cached(file_content_key(image_path), image_path, save_result, load)
+
+    def process_image_bytes(self, data, image_name, save_result=None):
+        print(f"\nProcessing image: {os.path.basename(image_name)}")
+        content_key = None
+        if self.result_cache is not None or self.gray_cache is not None:
+            content_key = bytes_content_key(data)
+        return self._process_cached(content_key, image_name, save_result, lambda: self._decode(data, image_name))
+
+    def process_blob(self, blob, save_result=None):
+        print(f"\nProcessing image: {os.path.basename(blob.name)}")
+        return self._process_cached(blob_content_key(blob), blob.name, save_result,
+                                    lambda: self._decode(blob.download_as_bytes(), blob.name))
+
+    def _decode(self, data, image_name):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"Failed to decode image: {image_name}")
+        return image
+
+    def _process_cached(self, content_key, image_path, save_result, load):
+        """load() returns the BGR image; it is not called when the result or the grayscale image is cached"""
+        if save_result is None:
+            save_result = self.save_results
+        if self.result_cache is None or content_key is None:
+            return self._process_source(content_key, image_path, save_result, load)
+
+        # The result image is named after the upload, so saved results are cached per name
+        key = f"{content_key}#{image_path}" if save_result else content_key
+        computed = []
+
+        def compute():
+            computed.append(True)
+            return self._process_source(content_key, image_path, save_result, load)
+
+        result = self.result_cache.get_or_compute(key, compute)
+        if not computed:
+            print(f"Cached result: {result}")
+        # Same contents may have been checked under another name
+        return dict(result, image_path=image_path)
+
+    def _process_source(self, content_key, image_path, save_result, load):
+        # Result images are drawn on the color image, so the grayscale cache is only used without one
+        gray_cache = self.gray_cache if content_key is not None and not save_result else None
+        image = gray_cache.get(content_key) if gray_cache is not None else None
+        if image is None:
+            image = load()
+            if image is not None and gray_cache is not None:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                gray_cache.put(content_key, image)
+        return self.process_loaded_image(image, image_path, save_result)
+
+    def process_loaded_image(self, image, image_path, save_result=None):
+        """image is BGR, or grayscale when no result image is written"""
+        corners, ids = self.find_markers(image) if image is not None else ((), None)
+        detected_count = len(ids) if ids is not None else 0
         aruco_check = self.check_aruco_condition(detected_count)
 
+        pose = None
+        if self.pose_estimator is not None and image is not None:
+            pose = self.pose_estimator.evaluate(corners, ids, image.shape)
+            if pose["pose_check"] == 0:
+                print(f"✗ Pose out of range: {pose['pairs'] or 'fewer than two markers'}")
+                aruco_check = 0
+
+        if save_result is None:
+            save_result = self.save_results
         result_filename = None
-        if result_image is not None:
-            base_name = os.path.basename(image_path)
-            name, ext = os.path.splitext(base_name)
-            result_filename = f"result_{name}{ext}"
-            result_path = os.path.join(self.result_dir, result_filename)
-            cv2.imwrite(result_path, result_image)
-            print(f"Saved result image: {result_path}")
-
-        return {
+        if image is not None and save_result:
+            result_filename = self.save_result_image(image, image_path, corners, ids)
+
+        result = {
             "image_path": image_path,
             "ArUco_check": aruco_check,
             "detected_count": detected_count,
             "target_count": self.ArUco_num,
-            "marker_ids": marker_ids.tolist() if marker_ids is not None else [],
+            "marker_ids": ids.flatten().tolist() if ids is not None else [],
             "result_image": result_filename
         }
+        if pose is not None:
+            result["pose"] = pose
+        return result
 
-    def process_latest_image(self):
+    def save_result_image(self, image, image_path, corners, ids):
+        base_name = os.path.basename(image_path)
+        name, ext = os.path.splitext(base_name)
+        result_filename = f"result_{name}{ext}"
+        result_path = os.path.join(self.result_dir, result_filename)
+        if self.result_writer is not None:
+            if not self.result_writer.submit(result_path, image, corners, ids):
+                print(f"Result image queue is full, skipped: {result_path}")
+                return None
+            return result_filename
+        cv2.imwrite(result_path, render_result_image(image, corners, ids))
+        print(f"Saved result image: {result_path}")
+        return result_filename
+
+    def process_latest_image(self, save_result=None):
         latest_image = self.get_latest_image_file()
         if latest_image is None:
             print("No images found.")
             return
-        result = self.process_image(latest_image)
+        result = self.process_image(latest_image, save_result=save_result)
         print(f"\nResult: {result}")
         return result
 
-    def process_all_images(self):
+    def process_all_images(self, workers=None):
+        """workers=1 runs serially in this process; otherwise a process pool (see aruco_batch.py)"""
         image_files = self.get_image_files()
         if not image_files:
             print("No images found.")
-            return
-        for image_path in image_files:
-            self.process_image(image_path)
+            return summarize([])
+        if workers == 1:
+            summary = summarize([self.process_image(image_path) for image_path in image_files])
+        else:
+            summary = detect_folder(
+                image_files, self.ArUco_num, workers=workers,
+                on_result=lambda r: print(f"{os.path.basename(r['image_path'])}: "
+                                          f"detected {r['detected_count']}, ArUco_check={r['ArUco_check']}"),
+                dictionary_id=self.dictionary_id, detector_params=self.detector_params,
+                coarse_max_side=self.coarse_max_side, result_dir=self.result_dir if self.save_results else None,
+                pose_estimator=self.pose_estimator,
+            )
+        print(f"\nProcessed {summary['total_images']} images, matched {summary['matched_images']}")
+        return summary
 
 # ========== Configuration ==========
 
@@ -2,36 +2,33 @@ import cv2
 import numpy as np
 import os
 from datetime import datetime
-import glob
+
+from aruco_detectors import DEFAULT_DICTIONARY, detect_markers, get_config
+from aruco_batch import detect_folder
+from image_index import get_image_index
 
 class ArUcoImageDetectionSystem:
-    def __init__(self, target_aruco_num=1, image_folder="images"):
+    def __init__(self, target_aruco_num=1, image_folder="images",
+                 dictionary_id=DEFAULT_DICTIONARY, detector_params=None, coarse_max_side=None):
         """
         ArUcoマーカー検出システムの初期化（画像ファイル処理用）
         
         Args:
             target_aruco_num (int): 検出したいArUcoマーカーの数
             image_folder (str): 処理対象の画像が格納されているフォルダパス
+            dictionary_id (int): ArUco辞書（既定は一般的な4x4_50）
+            detector_params (dict): DetectorParametersの上書き設定
+            coarse_max_side (int): 大きな画像は長辺をこのサイズに縮小して先に検出する（Noneなら常に原寸）
         """
         self.ArUco_num = target_aruco_num
         self.ArUco_check = 0
         self.image_folder = image_folder
         
-        # ArUco辞書の設定（一般的な4x4_50を使用）
-        # OpenCVのバージョンに応じて適切なAPIを使用
-        try:
-            # OpenCV 4.7.0以降の新しいAPI
-            self.aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
-            self.aruco_params = cv2.aruco.DetectorParameters()
-        except AttributeError:
-            try:
-                # OpenCV 4.6.x以前の古いAPI
-                self.aruco_dict = cv2.aruco.Dictionary_get(cv2.aruco.DICT_4X4_50)
-                self.aruco_params = cv2.aruco.DetectorParameters_create()
-            except AttributeError:
-                # さらに古いバージョンの場合
-                self.aruco_dict = cv2.aruco.Dictionary(cv2.aruco.DICT_4X4_50)
-                self.aruco_params = cv2.aruco.DetectorParameters_create()
+        # ArUco辞書と検出パラメータはプロセス内で共有する（OpenCVのバージョン差も aruco_detectors.py で吸収）
+        self.dictionary_id = dictionary_id
+        self.detector_params = detector_params
+        self.aruco_dict, self.aruco_params = get_config(dictionary_id, detector_params)
+        self.coarse_max_side = coarse_max_side
         
         # 結果保存用のディレクトリ
         self.result_dir = "detection_results" #先に用意しといてもいいし、なかったら自動で生成する。
@@ -49,16 +46,8 @@ class ArUcoImageDetectionSystem:
             print(f"指定されたフォルダが存在しません: {self.image_folder}")
             return []
         
-        # サポートする画像形式
-        extensions = ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']
-        image_files = []
-        
-        for extension in extensions:
-            pattern = os.path.join(self.image_folder, extension)
-            image_files.extend(glob.glob(pattern))
-        
-        image_files.sort()  # ファイル名順にソート
-        return image_files
+        # フォルダの索引（image_index.py）からファイル名順に取得
+        return get_image_index(self.image_folder).files()
     
     def get_latest_image_file(self):
         """
@@ -71,21 +60,12 @@ class ArUcoImageDetectionSystem:
             print(f"指定されたフォルダが存在しません: {self.image_folder}")
             return None
         
-        # サポートする画像形式
-        extensions = ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']
-        image_files = []
-        
-        for extension in extensions:
-            pattern = os.path.join(self.image_folder, extension)
-            image_files.extend(glob.glob(pattern))
-        
-        if not image_files:
+        # 最新のファイルを取得（索引が更新日時順に保持しているので全ファイルの stat は不要）
+        latest_file = get_image_index(self.image_folder).latest()
+        if latest_file is None:
             print("処理対象の画像ファイルが見つかりませんでした")
             return None
         
-        # 最新のファイルを取得（更新日時順）
-        latest_file = max(image_files, key=os.path.getmtime)
-        
         # 最新ファイルの情報を表示
         latest_time = os.path.getmtime(latest_file)
         latest_datetime = datetime.fromtimestamp(latest_time)
@@ -113,16 +93,11 @@ class ArUcoImageDetectionSystem:
         # グレースケールに変換
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
-        # ArUcoマーカーを検出（OpenCVバージョンに対応）
-        try:
-            # 新しいAPI
-            detector = cv2.aruco.ArucoDetector(self.aruco_dict, self.aruco_params)
-            corners, ids, rejected = detector.detectMarkers(gray)
-        except AttributeError:
-            # 古いAPI
-            corners, ids, rejected = cv2.aruco.detectMarkers(
-                gray, self.aruco_dict, parameters=self.aruco_params
-            )
+        # ArUcoマーカーを検出（縮小画像で見つけて原寸で角を補正。設定数に足りなければ原寸で検出し直す）
+        corners, ids, coarse = detect_markers(
+            gray, self.dictionary_id, self.detector_params,
+            max_side=self.coarse_max_side, min_markers=self.ArUco_num,
+        )
         
         detected_count = 0
         marker_ids = None
@@ -241,10 +216,13 @@ class ArUcoImageDetectionSystem:
             "latest_image": os.path.basename(latest_image_path)
         }
     
-    def process_all_images(self):
+    def process_all_images(self, workers=None):
         """
         指定されたフォルダ内のすべての画像を処理
         
+        Args:
+            workers (int): 並列に処理するプロセス数（None: CPUコア数, 1: このプロセスで逐次処理）
+        
         Returns:
             dict: 全体の処理結果
         """
@@ -266,6 +244,20 @@ class ArUcoImageDetectionSystem:
         
         print(f"見つかった画像ファイル数: {len(image_files)}")
         
+        if workers != 1:
+            # プロセスプールで並列に処理し、終わった画像から順に結果を表示する
+            summary = detect_folder(
+                image_files, self.ArUco_num, workers=workers,
+                on_result=lambda r: print(f"{os.path.basename(r['image_path'])}: "
+                                          f"検出数={r['detected_count']}, 条件={r['ArUco_check']}"),
+                dictionary_id=self.dictionary_id, detector_params=self.detector_params,
+                coarse_max_side=self.coarse_max_side, result_dir=self.result_dir,
+            )
+            print(f"\n=== 処理完了 ===")
+            print(f"処理した画像数: {summary['total_images']}")
+            print(f"条件を満たした画像数: {summary['matched_images']}")
+            return summary
+        
         # 各画像を処理
         all_results = []
         matched_count = 0
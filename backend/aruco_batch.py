@@ -0,0 +1,172 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from aruco_detectors import DEFAULT_DICTIONARY, detect_markers
+
+# ========== Batch Detection ==========
+# Images are spread over a process pool sized to the core count. A reader thread
+# loads file bytes into a bounded queue, so disk reads overlap with decoding and
+# detection in the workers. Results are yielded as they finish, not in file order.
+
+_worker = {}
+
+
+def _init_worker(target_count, dictionary_id, detector_params, coarse_max_side, result_dir, pose_estimator=None):
+    _worker.update(
+        target_count=target_count,
+        dictionary_id=dictionary_id,
+        detector_params=detector_params,
+        coarse_max_side=coarse_max_side,
+        result_dir=result_dir,
+        pose_estimator=pose_estimator,
+    )
+
+
+def _detect(image_path, data):
+    target_count = _worker["target_count"]
+    result = {
+        "image_path": image_path,
+        "ArUco_check": 0,
+        "detected_count": 0,
+        "target_count": target_count,
+        "marker_ids": [],
+        "result_image": None,
+    }
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+    if image is None:
+        return result
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    corners, ids, _ = detect_markers(
+        gray, _worker["dictionary_id"], _worker["detector_params"],
+        max_side=_worker["coarse_max_side"], min_markers=target_count,
+    )
+    if ids is not None:
+        result["detected_count"] = len(ids)
+        result["marker_ids"] = ids.flatten().tolist()
+    result["ArUco_check"] = 1 if result["detected_count"] == target_count else 0
+    if _worker["pose_estimator"] is not None:
+        result["pose"] = _worker["pose_estimator"].evaluate(corners, ids, image.shape)
+        if result["pose"]["pose_check"] == 0:
+            result["ArUco_check"] = 0
+
+    if _worker["result_dir"]:
+        if ids is not None:
+            cv2.aruco.drawDetectedMarkers(image, corners, ids)
+        name, ext = os.path.splitext(os.path.basename(image_path))
+        result["result_image"] = f"result_{name}{ext}"
+        cv2.imwrite(os.path.join(_worker["result_dir"], result["result_image"]), image)
+    return result
+
+
+def _read_files(paths, out, stop):
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            data = None
+        while not stop.is_set():
+            try:
+                out.put((path, data), timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        if stop.is_set():
+            return
+    out.put(None)
+
+
+def iter_detect(image_paths, target_count, workers=None, prefetch=None,
+                dictionary_id=DEFAULT_DICTIONARY, detector_params=None, coarse_max_side=None,
+                result_dir="detection_results", pose_estimator=None):
+    """Detect markers in every image and yield each result dict as soon as it is ready"""
+    workers = workers or os.cpu_count() or 1
+    prefetch = prefetch or workers * 2
+    if result_dir:
+        os.makedirs(result_dir, exist_ok=True)
+
+    loaded = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    reader = threading.Thread(target=_read_files, args=(list(image_paths), loaded, stop), daemon=True)
+    reader.start()
+
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(target_count, dictionary_id, detector_params, coarse_max_side, result_dir, pose_estimator),
+    )
+    try:
+        inflight = set()
+        exhausted = False
+        while not exhausted or inflight:
+            # Keep at most `prefetch` images in the pool so memory stays bounded
+            while not exhausted and len(inflight) < prefetch:
+                item = loaded.get()
+                if item is None:
+                    exhausted = True
+                    break
+                inflight.add(pool.submit(_detect, *item))
+            if not inflight:
+                continue
+            done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def summarize(results):
+    matched = sum(1 for r in results if r["ArUco_check"] == 1)
+    return {
+        "total_images": len(results),
+        "matched_images": matched,
+        "results": results,
+        "ArUco_check": 1 if matched > 0 else 0,
+    }
+
+
+def detect_folder(image_paths, target_count, workers=None, on_result=None, **kwargs):
+    """Run iter_detect over all images and return the aggregate summary"""
+    results = []
+    for result in iter_detect(image_paths, target_count, workers=workers, **kwargs):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    # Same order as the serial path (file name order)
+    results.sort(key=lambda r: r["image_path"])
+    return summarize(results)
+
+
+# ========== Main Execution ==========
+
+if __name__ == "__main__":
+    import glob
+
+    parser = argparse.ArgumentParser(description="Batch ArUco detection over an image folder")
+    parser.add_argument("folder")
+    parser.add_argument("--target", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-save", action="store_true", help="do not write result_* images")
+    parser.add_argument("--coarse-max-side", type=int, default=None, help="detect on a downscaled copy first")
+    args = parser.parse_args()
+
+    paths = sorted(
+        p for p in glob.glob(os.path.join(args.folder, "*"))
+        if p.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+    t0 = time.perf_counter()
+    summary = detect_folder(paths, args.target, workers=args.workers, coarse_max_side=args.coarse_max_side,
+                            result_dir=None if args.no_save else "detection_results")
+    elapsed = time.perf_counter() - t0
+    print(f"{summary['total_images']} images, {summary['matched_images']} matched, "
+          f"{elapsed:.2f} s ({summary['total_images'] / elapsed if elapsed else 0:.1f} images/s, "
+          f"workers={args.workers or os.cpu_count()})")
@@ -0,0 +1,123 @@
+import threading
+
+import cv2
+import numpy as np
+
+# ========== Shared ArUco Detectors ==========
+# Dictionaries and DetectorParameters are built once per process for each
+# (dictionary, parameter set) key. ArucoDetector instances are kept per thread,
+# since OpenCV does not document detectMarkers as safe for concurrent calls on
+# one instance.
+
+DEFAULT_DICTIONARY = cv2.aruco.DICT_4X4_50
+
+_lock = threading.Lock()
+_configs = {}  # key -> (dictionary, parameters)
+_local = threading.local()
+_created = 0
+
+
+class LegacyDetector:
+    """detectMarkers wrapper for OpenCV < 4.7, which has no ArucoDetector"""
+
+    def __init__(self, dictionary, parameters):
+        self.dictionary = dictionary
+        self.parameters = parameters
+
+    def detectMarkers(self, gray):
+        return cv2.aruco.detectMarkers(gray, self.dictionary, parameters=self.parameters)
+
+
+def _make_key(dictionary_id, params):
+    return dictionary_id, tuple(sorted((params or {}).items()))
+
+
+def _build_config(dictionary_id, params):
+    try:
+        dictionary = cv2.aruco.getPredefinedDictionary(dictionary_id)
+        parameters = cv2.aruco.DetectorParameters()
+    except AttributeError:
+        dictionary = cv2.aruco.Dictionary_get(dictionary_id)
+        parameters = cv2.aruco.DetectorParameters_create()
+    for name, value in (params or {}).items():
+        setattr(parameters, name, value)
+    return dictionary, parameters
+
+
+def get_config(dictionary_id=DEFAULT_DICTIONARY, params=None):
+    """Return the shared (dictionary, parameters) pair for this key"""
+    key = _make_key(dictionary_id, params)
+    config = _configs.get(key)
+    if config is None:
+        with _lock:
+            config = _configs.get(key)
+            if config is None:
+                config = _configs[key] = _build_config(dictionary_id, params)
+    return config
+
+
+def get_detector(dictionary_id=DEFAULT_DICTIONARY, params=None):
+    """
+    Return this thread's detector for the given dictionary and parameter overrides.
+
+    params is a dict of DetectorParameters attributes, e.g. {"adaptiveThreshWinSizeMax": 33}.
+    """
+    global _created
+    key = _make_key(dictionary_id, params)
+    detectors = getattr(_local, "detectors", None)
+    if detectors is None:
+        detectors = _local.detectors = {}
+    detector = detectors.get(key)
+    if detector is None:
+        dictionary, parameters = get_config(dictionary_id, params)
+        try:
+            detector = cv2.aruco.ArucoDetector(dictionary, parameters)
+        except AttributeError:
+            detector = LegacyDetector(dictionary, parameters)
+        detectors[key] = detector
+        with _lock:
+            _created += 1
+    return detector
+
+
+def stats():
+    with _lock:
+        return {"configs": len(_configs), "detectors": _created}
+
+
+# ========== Coarse-to-Fine Detection ==========
+# Phone uploads are 12 MP or more while the markers fill a large part of the frame.
+# Detect on a copy whose long side is max_side, scale the corners back and refine
+# them with cornerSubPix in a window around each corner at full resolution. If the
+# coarse pass finds fewer than min_markers markers, detect on the full image instead.
+
+def detect_markers(gray, dictionary_id=DEFAULT_DICTIONARY, params=None, max_side=None, min_markers=1):
+    """
+    Return (corners, ids, coarse) like detectMarkers, with coarse=True when the
+    downscaled pass was used. max_side=None (or an image already that small)
+    always detects at full resolution.
+    """
+    detector = get_detector(dictionary_id, params)
+    height, width = gray.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        corners, ids, _ = detector.detectMarkers(gray)
+        return corners, ids, False
+
+    scale = max_side / max(height, width)
+    small = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    corners, ids, _ = detector.detectMarkers(small)
+    if ids is None or len(ids) < min_markers:
+        corners, ids, _ = detector.detectMarkers(gray)
+        return corners, ids, False
+
+    # One coarse pixel covers 1/scale full-resolution pixels; search a little beyond that
+    half = max(3, int(round(1.5 / scale)))
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.05)
+    refined = []
+    for marker in corners:
+        points = ((marker.reshape(-1, 2) + 0.5) / scale - 0.5).astype(np.float32)
+        # Keep the window inside the image; cornerSubPix needs the whole window
+        np.clip(points, half + 1, [width - half - 2, height - half - 2], out=points)
+        cv2.cornerSubPix(gray, points, (half, half), (-1, -1), criteria)
+        refined.append(points.reshape(1, -1, 2))
+    return tuple(refined), ids, True
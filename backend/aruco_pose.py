@@ -0,0 +1,155 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+# ========== Marker Pose ==========
+# Optional stage after detection that reuses the corners already found. It
+# estimates every marker's pose and returns the distance and the angle between
+# each pair of markers. A photo of a printed marker sheet has the
+# markers a few centimetres apart, and a badly parked bike has its marker turned
+# against the dock's. Both fail the configured limits even though the count matches.
+#
+# Each marker is solved with SOLVEPNP_IPPE_SQUARE, the closed-form solver for the
+# four corners of a square (about 20 us per marker). It breaks down on a marker
+# seen exactly face-on (screenshots, synthetic images), so a solution whose
+# reprojection error exceeds REPROJECTION_LIMIT pixels is solved again with
+# SOLVEPNP_ITERATIVE. The pair distances and angles are computed for all markers
+# at once with numpy.
+
+ARUCO_MARKER_LENGTH = float(os.environ.get("ARUCO_MARKER_LENGTH", 0.10))  # side of the black square, metres
+ARUCO_CAMERA_CALIBRATION = os.environ.get("ARUCO_CAMERA_CALIBRATION")  # JSON: {"camera_matrix", "dist_coeffs"}
+# Without a calibration: fx = fy = ratio * long side, principal point at the centre
+# (0.8 is roughly a phone's main camera, about 65 degrees across the long side)
+ARUCO_FOCAL_RATIO = float(os.environ.get("ARUCO_FOCAL_RATIO", 0.8))
+# Parking limits; unset (0) disables the check
+ARUCO_PAIR_DISTANCE_MIN = float(os.environ.get("ARUCO_PAIR_DISTANCE_MIN", 0)) or None
+ARUCO_PAIR_DISTANCE_MAX = float(os.environ.get("ARUCO_PAIR_DISTANCE_MAX", 0)) or None
+ARUCO_PAIR_ANGLE_MAX = float(os.environ.get("ARUCO_PAIR_ANGLE_MAX", 0)) or None
+
+REPROJECTION_LIMIT = 2.0
+
+
+def load_calibration(path):
+    """Read (camera_matrix, dist_coeffs) from a JSON file, e.g. the output of cv2.calibrateCamera"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    camera_matrix = np.array(data["camera_matrix"], dtype=np.float64).reshape(3, 3)
+    dist_coeffs = np.array(data.get("dist_coeffs", []), dtype=np.float64).ravel()
+    return camera_matrix, dist_coeffs
+
+
+def approximate_camera_matrix(width, height, focal_ratio=ARUCO_FOCAL_RATIO):
+    focal = focal_ratio * max(width, height)
+    return np.array([[focal, 0, (width - 1) / 2], [0, focal, (height - 1) / 2], [0, 0, 1]], dtype=np.float64)
+
+
+def marker_object_points(marker_length):
+    """Marker corners (top-left, top-right, bottom-right, bottom-left) on z = 0, as SOLVEPNP_IPPE_SQUARE expects"""
+    half = marker_length / 2
+    return np.array([[-half, half, 0], [half, half, 0], [half, -half, 0], [-half, -half, 0]], dtype=np.float64)
+
+
+def estimate_poses(corners, camera_matrix, dist_coeffs, marker_length):
+    """
+    Pose of every marker; corners is the detectMarkers output.
+    Returns rotations (N, 3, 3) and translations (N, 3) in the camera frame.
+    """
+    object_points = marker_object_points(marker_length)
+    rotations = np.empty((len(corners), 3, 3))
+    translations = np.empty((len(corners), 3))
+    for i, marker in enumerate(corners):
+        image_points = np.asarray(marker, dtype=np.float64).reshape(4, 2)
+        # Two solutions for a square, best first
+        _, rvecs, tvecs, errors = cv2.solvePnPGeneric(object_points, image_points, camera_matrix, dist_coeffs,
+                                                      flags=cv2.SOLVEPNP_IPPE_SQUARE)
+        rvec, tvec = rvecs[0], tvecs[0]
+        if errors[0][0] > REPROJECTION_LIMIT:
+            _, rvec, tvec = cv2.solvePnP(object_points, image_points, camera_matrix, dist_coeffs,
+                                         flags=cv2.SOLVEPNP_ITERATIVE)
+        rotations[i] = cv2.Rodrigues(rvec)[0]
+        translations[i] = tvec.ravel()
+    return rotations, translations
+
+
+def pairwise_geometry(rotations, translations):
+    """Distance (N, N) between marker centres and rotation angle (N, N) between markers, in degrees"""
+    distances = np.linalg.norm(translations[:, None, :] - translations[None, :, :], axis=2)
+    # trace(Ra^T Rb) for every pair
+    traces = np.einsum("aji,bji->ab", rotations, rotations)
+    angles = np.degrees(np.arccos(np.clip((traces - 1) / 2, -1.0, 1.0)))
+    return distances, angles
+
+
+class PoseEstimator:
+    def __init__(self, marker_length=ARUCO_MARKER_LENGTH, camera_matrix=None, dist_coeffs=None,
+                 focal_ratio=ARUCO_FOCAL_RATIO, distance_range=None, max_angle=None):
+        """
+        marker_length: printed side of the black square in metres (distances come out in the same unit)
+        camera_matrix, dist_coeffs: calibration; without one, approximated from the image size
+        distance_range: (min, max) allowed distance between two markers, either may be None
+        max_angle: largest allowed rotation between two markers, in degrees
+        """
+        self.marker_length = marker_length
+        self.camera_matrix = camera_matrix
+        self.dist_coeffs = dist_coeffs if dist_coeffs is not None else np.zeros(5)
+        self.focal_ratio = focal_ratio
+        self.distance_range = distance_range or (None, None)
+        self.max_angle = max_angle
+
+    @classmethod
+    def from_env(cls):
+        camera_matrix = dist_coeffs = None
+        if ARUCO_CAMERA_CALIBRATION:
+            camera_matrix, dist_coeffs = load_calibration(ARUCO_CAMERA_CALIBRATION)
+        return cls(
+            camera_matrix=camera_matrix, dist_coeffs=dist_coeffs,
+            distance_range=(ARUCO_PAIR_DISTANCE_MIN, ARUCO_PAIR_DISTANCE_MAX),
+            max_angle=ARUCO_PAIR_ANGLE_MAX,
+        )
+
+    @property
+    def has_limits(self):
+        return any(limit is not None for limit in (*self.distance_range, self.max_angle))
+
+    def pair_ok(self, distance, angle):
+        low, high = self.distance_range
+        return ((low is None or distance >= low) and (high is None or distance <= high)
+                and (self.max_angle is None or angle <= self.max_angle))
+
+    def evaluate(self, corners, ids, image_shape):
+        """
+        Pose summary for the detected markers. pose_check is 1 when every pair is
+        within the limits, 0 otherwise (also with fewer than two markers), and
+        None when no limits are configured.
+        """
+        if ids is None or len(ids) == 0:
+            return {"markers": [], "pairs": [], "pose_check": 0 if self.has_limits else None}
+
+        camera_matrix = self.camera_matrix
+        if camera_matrix is None:
+            camera_matrix = approximate_camera_matrix(image_shape[1], image_shape[0], self.focal_ratio)
+        rotations, translations = estimate_poses(corners, camera_matrix, self.dist_coeffs, self.marker_length)
+
+        marker_ids = ids.flatten().tolist()
+        markers = [
+            {"id": marker_id, "distance": round(float(np.linalg.norm(t)), 4), "tvec": np.round(t, 4).tolist()}
+            for marker_id, t in zip(marker_ids, translations)
+        ]
+        distances, angles = pairwise_geometry(rotations, translations)
+        pairs = []
+        for i in range(len(marker_ids)):
+            for j in range(i + 1, len(marker_ids)):
+                distance, angle = float(distances[i, j]), float(angles[i, j])
+                pairs.append({
+                    "ids": [marker_ids[i], marker_ids[j]],
+                    "distance": round(distance, 4),
+                    "angle": round(angle, 2),
+                    "ok": self.pair_ok(distance, angle),
+                })
+
+        pose_check = None
+        if self.has_limits:
+            pose_check = 1 if pairs and all(p["ok"] for p in pairs) else 0
+        return {"markers": markers, "pairs": pairs, "pose_check": pose_check}
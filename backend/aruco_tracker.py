@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+from aruco_detectors import detect_markers, get_detector
+
+# ========== Temporal Marker Tracking ==========
+# In a video of the dock the same markers stay at almost the same place, so after
+# a full-frame detection the next frames are only searched in a window around each
+# marker's previous corners. A full-frame detection runs every full_every frames,
+# and immediately when a tracked marker is not found in its window or fewer than
+# target_aruco_num markers are being tracked.
+
+
+class MarkerTracker:
+    def __init__(self, system, full_every=15, margin=0.6):
+        """
+        system: an ArUcoImageDetectionSystem (dictionary, parameters, target count and coarse mode are reused)
+        margin: window padding around the previous corners, as a fraction of the marker size
+        """
+        self.system = system
+        self.full_every = full_every
+        self.margin = margin
+        self._tracked = {}  # marker id -> (4, 2) corners in the previous frame
+        self._since_full = 0
+
+        self.frames = 0
+        self.full_detections = 0
+        self.roi_detections = 0
+        self.lost = 0
+
+    def reset(self):
+        self._tracked = {}
+        self._since_full = 0
+
+    def _full(self, gray):
+        corners, ids, _ = detect_markers(
+            gray, self.system.dictionary_id, self.system.detector_params,
+            max_side=self.system.coarse_max_side, min_markers=self.system.ArUco_num,
+        )
+        self.full_detections += 1
+        self._since_full = 0
+        self._tracked = {}
+        if ids is not None:
+            for marker_id, marker in zip(ids.flatten().tolist(), corners):
+                self._tracked[marker_id] = marker.reshape(-1, 2)
+        return self._tracked
+
+    def _track(self, gray):
+        height, width = gray.shape[:2]
+        detector = get_detector(self.system.dictionary_id, self.system.detector_params)
+        found = {}
+        for marker_id, previous in self._tracked.items():
+            x0, y0 = previous.min(axis=0)
+            x1, y1 = previous.max(axis=0)
+            pad = self.margin * max(x1 - x0, y1 - y0)
+            x0, y0 = max(0, int(x0 - pad)), max(0, int(y0 - pad))
+            x1, y1 = min(width, int(np.ceil(x1 + pad))), min(height, int(np.ceil(y1 + pad)))
+            if x1 <= x0 or y1 <= y0:
+                return None
+            corners, ids, _ = detector.detectMarkers(gray[y0:y1, x0:x1])
+            if ids is None:
+                return None
+            for roi_id, marker in zip(ids.flatten().tolist(), corners):
+                if roi_id == marker_id:
+                    found[marker_id] = marker.reshape(-1, 2) + (x0, y0)
+                    break
+            else:
+                return None
+        self.roi_detections += 1
+        self._since_full += 1
+        self._tracked = found
+        return found
+
+    def update(self, frame):
+        """
+        Detect markers in the next frame. Returns (corners, ids, mode) in the same
+        layout as detectMarkers, with mode "full" or "roi".
+        """
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.frames += 1
+
+        found = None
+        if (self._tracked and len(self._tracked) >= self.system.ArUco_num
+                and self._since_full + 1 < self.full_every):
+            found = self._track(gray)
+            if found is None:
+                self.lost += 1
+        mode = "roi"
+        if found is None:
+            found = self._full(gray)
+            mode = "full"
+
+        if not found:
+            return (), None, mode
+        marker_ids = sorted(found)
+        corners = tuple(found[i].reshape(1, -1, 2).astype(np.float32) for i in marker_ids)
+        return corners, np.array(marker_ids, dtype=np.int32).reshape(-1, 1), mode
+
+    def process_frame(self, frame):
+        """Same keys as ArUcoImageDetectionSystem results, for one video frame"""
+        corners, ids, mode = self.update(frame)
+        detected_count = len(ids) if ids is not None else 0
+        return {
+            "ArUco_check": 1 if detected_count == self.system.ArUco_num else 0,
+            "detected_count": detected_count,
+            "target_count": self.system.ArUco_num,
+            "marker_ids": ids.flatten().tolist() if ids is not None else [],
+            "mode": mode,
+        }
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "full_detections": self.full_detections,
+            "roi_detections": self.roi_detections,
+            "lost": self.lost,
+        }
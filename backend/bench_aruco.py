@@ -0,0 +1,92 @@
+"""
+ArUco 検出器の使い回しによる 1 枚あたりの検出時間の比較
+
+  before: 画像・リクエストごとに辞書・パラメータ・cv2.aruco.ArucoDetector を作り直す（旧方式）
+  after : aruco_detectors.get_detector() でスレッドごとの検出器を使い回す
+
+    python bench_aruco.py --iterations 200 --width 1280 --height 720
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import aruco_detectors
+
+
+def make_marker_image(ids=(0, 1), width=1280, height=720, marker_px=200):
+    """白地に ArUco マーカーを横に並べた BGR 画像を作る"""
+    dictionary = cv2.aruco.getPredefinedDictionary(aruco_detectors.DEFAULT_DICTIONARY)
+    canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+    step = width // (len(ids) + 1)
+    y = (height - marker_px) // 2
+    for i, marker_id in enumerate(ids):
+        marker = cv2.aruco.generateImageMarker(dictionary, marker_id, marker_px)
+        x = step * (i + 1) - marker_px // 2
+        canvas[y:y + marker_px, x:x + marker_px] = cv2.cvtColor(marker, cv2.COLOR_GRAY2BGR)
+    return canvas
+
+
+def timed_pair(fn_a, fn_b, iterations):
+    """2つの処理を交互に実行して時間を測る（CPU クロックの揺らぎを両方に均等にかける）"""
+    a, b = [], []
+    for _ in range(iterations):
+        for fn, samples in ((fn_a, a), (fn_b, b)):
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+    return a, b
+
+
+def report(label, samples):
+    print(f"  {label:<12} n={len(samples):<5} mean={statistics.mean(samples) * 1000:8.3f} ms  "
+          f"p50={statistics.median(samples) * 1000:8.3f} ms")
+
+
+def compare(title, before, after):
+    print(title)
+    report("before", before)
+    report("after", after)
+    saved = statistics.median(before) - statistics.median(after)
+    print(f"  saved (p50): {saved * 1000:.3f} ms ({saved / statistics.median(before) * 100:.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+
+    gray = cv2.cvtColor(make_marker_image(width=args.width, height=args.height), cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (160, 90))
+    dictionary, parameters = aruco_detectors.get_config()
+    aruco_detectors.get_detector()  # 1回目の構築を計測から外す
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        def old_setup():
+            # 旧 /run-detection: 辞書・パラメータ・makedirs・検出器をリクエストごとに用意していた
+            d = cv2.aruco.getPredefinedDictionary(aruco_detectors.DEFAULT_DICTIONARY)
+            p = cv2.aruco.DetectorParameters()
+            result_dir = os.path.join(work_dir, "detection_results")
+            if not os.path.exists(result_dir):
+                os.makedirs(result_dir)
+            return cv2.aruco.ArucoDetector(d, p)
+
+        compare("setup only (dictionary, parameters, makedirs, detector)",
+                *timed_pair(old_setup, aruco_detectors.get_detector, args.iterations))
+
+    for label, image in ((f"{args.width}x{args.height}", gray), ("160x90", small)):
+        compare(f"setup + detectMarkers {label}", *timed_pair(
+            lambda: cv2.aruco.ArucoDetector(dictionary, parameters).detectMarkers(image),
+            lambda: aruco_detectors.get_detector().detectMarkers(image),
+            args.iterations,
+        ))
+
+
+if __name__ == "__main__":
+    main()
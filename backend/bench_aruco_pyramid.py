@@ -0,0 +1,129 @@
+"""
+縮小画像での検出（coarse-to-fine）と原寸での検出の精度・速度の比較
+
+ラベル付き画像セットで、マーカー ID の一致率・角の位置誤差・1 枚あたりの検出時間を測る。
+--folder を指定しない場合は、スマホ写真相当（4032x3024）の合成画像を作ってラベルとして使う。
+一部の画像には小さいマーカーを入れてあり、縮小画像で見つからないときの原寸へのフォールバックも確認できる。
+
+    python bench_aruco_pyramid.py --images 30 --max-side 1280
+    python bench_aruco_pyramid.py --folder photos/   # photos/labels.json: {"pic1.jpg": [0, 1], ...}
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+import aruco_detectors
+
+
+def synthesize(rng, width=4032, height=3024, count=2, small=False):
+    """マーカーを射影変換して貼り付けた画像と (ID, 角の座標) のラベルを返す"""
+    dictionary = cv2.aruco.getPredefinedDictionary(aruco_detectors.DEFAULT_DICTIONARY)
+    image = rng.integers(90, 200, size=(height // 8, width // 8), dtype=np.uint8)
+    image = cv2.GaussianBlur(cv2.resize(image, (width, height)), (0, 0), 5)
+    labels = []
+    ids = rng.choice(50, size=count, replace=False)
+    for i, marker_id in enumerate(ids):
+        side = int(rng.uniform(36, 56) if small and i == 0 else rng.uniform(500, 1100))
+        # 白い余白つきのマーカーを作り、横に並べた位置に少し傾けて置く
+        quiet = side // 6
+        marker = np.full((side + 2 * quiet, side + 2 * quiet), 255, dtype=np.uint8)
+        marker[quiet:quiet + side, quiet:quiet + side] = cv2.aruco.generateImageMarker(dictionary, int(marker_id), side)
+        cx = width * (i + 1) / (count + 1) + rng.uniform(-200, 200)
+        cy = height / 2 + rng.uniform(-500, 500)
+        outer = side / 2 + quiet
+        square = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.float32)
+        dst = square * outer + rng.uniform(-0.12, 0.12, size=(4, 2)).astype(np.float32) * outer + [cx, cy]
+        src = (square + 1) / 2 * marker.shape[0]
+        matrix = cv2.getPerspectiveTransform(src.astype(np.float32), dst.astype(np.float32))
+        warped = cv2.warpPerspective(marker, matrix, (width, height), flags=cv2.INTER_LINEAR, borderValue=0)
+        mask = cv2.warpPerspective(np.full_like(marker, 255), matrix, (width, height), borderValue=0)
+        image[mask > 0] = warped[mask > 0]
+        inner = np.array([[quiet, quiet], [quiet + side, quiet], [quiet + side, quiet + side], [quiet, quiet + side]],
+                         dtype=np.float32)
+        corners = cv2.perspectiveTransform(inner.reshape(-1, 1, 2), matrix).reshape(-1, 2)
+        labels.append((int(marker_id), corners))
+    noise = rng.normal(0, 4, size=image.shape)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(image, (0, 0), 1.0), labels
+
+
+def load_folder(folder):
+    with open(os.path.join(folder, "labels.json"), encoding="utf-8") as f:
+        labels = json.load(f)
+    for filename, ids in sorted(labels.items()):
+        gray = cv2.imread(os.path.join(folder, filename), cv2.IMREAD_GRAYSCALE)
+        if gray is not None:
+            yield filename, gray, [(int(i), None) for i in ids]
+
+
+def run(gray, max_side, min_markers):
+    t0 = time.perf_counter()
+    corners, ids, coarse = aruco_detectors.detect_markers(gray, max_side=max_side, min_markers=min_markers)
+    elapsed = time.perf_counter() - t0
+    found = {}
+    if ids is not None:
+        for marker_id, marker in zip(ids.flatten().tolist(), corners):
+            found[marker_id] = marker.reshape(-1, 2)
+    return found, coarse, elapsed
+
+
+def corner_error(found, labels):
+    errors = []
+    for marker_id, truth in labels:
+        if truth is not None and marker_id in found:
+            errors.append(float(np.linalg.norm(found[marker_id] - truth, axis=1).mean()))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folder", default=None, help="labels.json のある画像フォルダ")
+    parser.add_argument("--images", type=int, default=30, help="合成する画像の枚数")
+    parser.add_argument("--max-side", type=int, default=1280)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.folder:
+        samples = list(load_folder(args.folder))
+    else:
+        rng = np.random.default_rng(args.seed)
+        # 5 枚に 1 枚は小さいマーカーを含める（縮小画像では見つからず原寸に戻る想定）
+        samples = [(f"synthetic_{i:03d}", *synthesize(rng, small=i % 5 == 4)) for i in range(args.images)]
+
+    aruco_detectors.get_detector()
+    stats = {"full": {"correct": 0, "times": [], "errors": []},
+             "coarse": {"correct": 0, "times": [], "errors": []}}
+    agree = fallbacks = 0
+    for name, gray, labels in samples:
+        expected = sorted(marker_id for marker_id, _ in labels)
+        results = {}
+        for mode, max_side in (("full", None), ("coarse", args.max_side)):
+            found, coarse, elapsed = run(gray, max_side, len(labels))
+            results[mode] = sorted(found)
+            stats[mode]["times"].append(elapsed)
+            stats[mode]["errors"].extend(corner_error(found, labels))
+            stats[mode]["correct"] += sorted(found) == expected
+            if mode == "coarse" and not coarse:
+                fallbacks += 1
+        agree += results["full"] == results["coarse"]
+
+    n = len(samples)
+    height, width = samples[0][1].shape[:2] if samples else (0, 0)
+    print(f"{n} images ({width}x{height}), coarse long side {args.max_side}")
+    for mode in ("full", "coarse"):
+        s = stats[mode]
+        error = f"{statistics.mean(s['errors']):.2f} px" if s["errors"] else "n/a"
+        print(f"  {mode:<7} accuracy={s['correct']}/{n} ({s['correct'] / n * 100:.1f}%)  "
+              f"corner error={error}  mean={statistics.mean(s['times']) * 1000:8.1f} ms  "
+              f"p50={statistics.median(s['times']) * 1000:8.1f} ms")
+    print(f"  agreement with full resolution: {agree}/{n}, fell back to full resolution: {fallbacks}")
+    print(f"  speedup (mean): {statistics.mean(stats['full']['times']) / statistics.mean(stats['coarse']['times']):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+動画でのフレームごとの全画面検出と MarkerTracker（前フレームの周辺だけを探索）の fps 比較
+
+--video を指定しない場合は、駐輪場のマーカー 2 枚を撮り続けた想定の動画（手ぶれ程度に揺れる）を
+一時ファイルに書き出してフィクスチャとして使う。デコードは計測に含めないよう、先に全フレームを読み込む。
+
+    python bench_aruco_tracker.py --frames 300
+    python bench_aruco_tracker.py --video dock.mp4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from aruco_tracker import MarkerTracker
+from ArUco_check_only import ArUcoImageDetectionSystem
+from bench_aruco import make_marker_image
+
+
+def write_fixture(path, frames=300, width=1920, height=1080, fps=30, seed=0):
+    """マーカー 2 枚が少しずつ揺れる動画を書き出す（途中で一度、片方が遮られる）"""
+    rng = np.random.default_rng(seed)
+    base = make_marker_image(ids=(0, 1), width=width, height=height, marker_px=260)
+    texture = cv2.resize(rng.integers(120, 230, size=(height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+    base = np.where(base == 255, texture, base).astype(np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    dx = dy = 0.0
+    for i in range(frames):
+        dx = 0.9 * dx + rng.normal(0, 2.0)
+        dy = 0.9 * dy + rng.normal(0, 2.0)
+        angle = 2.0 * np.sin(i / 25)
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        matrix[:, 2] += (dx, dy)
+        frame = cv2.warpAffine(base, matrix, (width, height), borderMode=cv2.BORDER_REFLECT)
+        if frames // 2 + 7 <= i < frames // 2 + 17:
+            # 手などでマーカー 0 が一時的に隠れる（全画面検出の周期の途中で見失う）
+            frame[:, : width // 2] = 40
+        writer.write(frame)
+    writer.release()
+
+
+def read_frames(path, limit=None):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while limit is None or len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    cap.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video", default=None, help="録画した動画（省略時は合成したフィクスチャ）")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--target", type=int, default=2)
+    parser.add_argument("--full-every", type=int, default=15, help="全画面検出をやり直す間隔（フレーム）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = args.video
+        if path is None:
+            path = os.path.join(work_dir, "dock.avi")
+            write_fixture(path, frames=args.frames)
+        frames = read_frames(path, args.frames)
+
+        cwd = os.getcwd()
+        os.chdir(work_dir)  # detection_results/ を一時ディレクトリに作らせる
+        try:
+            system = ArUcoImageDetectionSystem(target_aruco_num=args.target, save_results=False)
+        finally:
+            os.chdir(cwd)
+
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames ({width}x{height}) from {args.video or 'synthetic fixture'}")
+
+    full_tracker = MarkerTracker(system, full_every=1)
+    tracker = MarkerTracker(system, full_every=args.full_every)
+    results = {}
+    for label, t in (("full-frame", full_tracker), ("tracker", tracker)):
+        ids = []
+        start = time.perf_counter()
+        for gray in frames:
+            _, marker_ids, _ = t.update(gray)
+            ids.append(tuple(marker_ids.flatten().tolist()) if marker_ids is not None else ())
+        elapsed = time.perf_counter() - start
+        results[label] = ids
+        print(f"  {label:<11} {len(frames) / elapsed:8.1f} fps  ({elapsed / len(frames) * 1000:6.2f} ms/frame)  {t.stats()}")
+
+    agree = sum(a == b for a, b in zip(results["full-frame"], results["tracker"]))
+    print(f"  same marker ids as full-frame detection: {agree}/{len(frames)} frames")
+
+
+if __name__ == "__main__":
+    main()
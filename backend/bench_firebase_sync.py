@@ -0,0 +1,77 @@
+"""
+Firebase 同期（download_firebase_images）の所要時間と、同期後の「最新の画像」の確認
+
+ローカルバケット（FIREBASE_BUCKET_DIR）に "<Date.now()>_<名前>" 形式のアップロードを並べ、
+ダウンロードごとにランダムな遅延を入れて完了順をばらばらにする。
+同期後に get_latest_image_file() が最後にアップロードされた画像を返すことを確認する（違えば終了コード 1）。
+
+    python bench_firebase_sync.py --uploads 12 --max-delay 0.2
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import ArUco_check_only
+from ArUco_check_only import ArUcoImageDetectionSystem, LocalBlob, download_firebase_images
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=12)
+    parser.add_argument("--max-delay", type=float, default=0.2, help="1 件のダウンロードに加える遅延の上限（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as work_dir:
+        uploads = os.path.join(work_dir, "bucket", "uploads")
+        os.makedirs(uploads)
+        start = time.time() - args.uploads * 60
+        names = []
+        for i in range(args.uploads):
+            name = f"{1700000000000 + i}_p.jpg"
+            path = os.path.join(uploads, name)
+            with open(path, "wb") as f:
+                f.write(os.urandom(1024))
+            # 1 分おきにアップロードされた想定
+            os.utime(path, (start + i * 60, start + i * 60))
+            names.append(name)
+        ArUco_check_only.FIREBASE_BUCKET_DIR = os.path.join(work_dir, "bucket")
+
+        # ダウンロードごとにランダムな遅延を入れ、完了順をアップロード順とばらばらにする
+        download = LocalBlob.download_to_filename
+
+        def slow_download(blob, filename):
+            time.sleep(rng.uniform(0, args.max_delay))
+            download(blob, filename)
+
+        LocalBlob.download_to_filename = slow_download
+
+        local_folder = os.path.join(work_dir, "captured_photos")
+        cwd = os.getcwd()
+        os.chdir(work_dir)  # detection_results/ を一時ディレクトリに作らせる
+        try:
+            t0 = time.perf_counter()
+            downloaded = download_firebase_images(local_folder=local_folder, firebase_folder="uploads")
+            elapsed = time.perf_counter() - t0
+            detector = ArUcoImageDetectionSystem(image_folder=local_folder, save_results=False)
+            latest = detector.get_latest_image_file()
+        finally:
+            os.chdir(cwd)
+            LocalBlob.download_to_filename = download
+
+    latest = os.path.basename(latest) if latest else None
+    print(f"{len(downloaded)} files in {elapsed:.2f} s "
+          f"(workers={ArUco_check_only.FIREBASE_SYNC_WORKERS}, delay up to {args.max_delay * 1000:.0f} ms)")
+    print(f"latest image: {latest} (expected {names[-1]})")
+    if latest != names[-1]:
+        print("✗ latest image is not the newest upload")
+        sys.exit(1)
+    print("✓ latest image is the newest upload")
+
+
+if __name__ == "__main__":
+    main()
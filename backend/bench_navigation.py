@@ -0,0 +1,105 @@
+"""
+/run-navigation のルート作成コストを比較するベンチマーク
+
+  before: リクエスト毎に navigation.py をサブプロセスで起動（旧 server.py の方式）
+  after : プロセス内で navigation.plan_route() を呼び出す
+
+ORS にはローカルスタブ (ors_stub.py) を使うので API キーもネットワークも不要。
+永続キャッシュ（ROUTE_CACHE_PATH / POI_INDEX_PATH）は無効にし、出発地点を毎回ずらして
+キャッシュに当たらないルート作成そのものを計測する。
+
+    python bench_navigation.py --requests 20 --latency 0.02
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from ors_stub import start_stub
+
+START = {"lat": 35.4675, "lon": 135.3960}
+END = {"lat": 35.4800, "lon": 135.4100}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def start_location(i):
+    # プロセス内のメモリキャッシュに当たらないよう、キャッシュキーの精度（小数 4 桁）より大きくずらす
+    return {"lat": round(START["lat"] + i * 0.0005, 4), "lon": START["lon"]}
+
+
+def report(label, samples, wall):
+    print(
+        f"{label:<12} n={len(samples):<4} "
+        f"mean={statistics.mean(samples) * 1000:8.1f} ms  "
+        f"p50={percentile(samples, 50) * 1000:8.1f} ms  "
+        f"p95={percentile(samples, 95) * 1000:8.1f} ms  "
+        f"rps={len(samples) / wall:8.1f}"
+    )
+
+
+def run_subprocess(n, out_dir, env):
+    nav_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "navigation.py")
+    samples = []
+    wall_start = time.perf_counter()
+    for i in range(n):
+        args = [
+            sys.executable, nav_path,
+            "--output", os.path.join(out_dir, f"sub_{i}.html"),
+            "--currentLocation", json.dumps(start_location(i)),
+            "--endLocation", json.dumps(END),
+        ]
+        t0 = time.perf_counter()
+        subprocess.run(args, check=True, capture_output=True, env=env)
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - wall_start
+
+
+def run_in_process(n, out_dir):
+    import navigation
+
+    samples = []
+    wall_start = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        navigation.plan_route(start_location(i), end_location=END, output=os.path.join(out_dir, f"inproc_{i}.html"))
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - wall_start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="スタブ ORS の応答遅延（秒）")
+    args = parser.parse_args()
+
+    server, base_url, counter = start_stub(latency=args.latency)
+    # navigation の import（サブプロセスでは起動時）より前に設定する。
+    # スタブの応答を backend/cache/ の本番キャッシュに書き込まないよう永続キャッシュは無効にする
+    os.environ["ORS_BASE_URL"] = base_url
+    os.environ["ROUTE_CACHE_PATH"] = ""
+    os.environ["POI_INDEX_PATH"] = ""
+    os.environ["POI_REFRESH_INTERVAL"] = "0"
+    env = dict(os.environ)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        before, before_wall = run_subprocess(args.requests, out_dir, env)
+        after, after_wall = run_in_process(args.requests, out_dir)
+
+    server.shutdown()
+    print(f"ORS stub: {base_url} (latency {args.latency * 1000:.0f} ms, {counter.total()} calls)")
+    report("subprocess", before, before_wall)
+    report("in-process", after, after_wall)
+    print(f"speedup (mean): {statistics.mean(before) / statistics.mean(after):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
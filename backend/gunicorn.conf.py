@@ -0,0 +1,19 @@
+# gunicorn の設定（本番用）
+#
+#   gunicorn -c gunicorn.conf.py server:app
+#
+# 処理時間の大半は ORS / Overpass / Firebase の応答待ちなので、
+# スレッドワーカー（gthread）で1プロセスあたり多数のリクエストを同時に待てるようにする。
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+# Overpass の 30 秒タイムアウトより長くしておく
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+# キャッシュやバックグラウンドスレッドはワーカーごとに持つ（fork 前に作らない）
+preload_app = False
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-") or None
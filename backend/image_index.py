@@ -0,0 +1,151 @@
+import bisect
+import os
+import threading
+
+# ========== Image Folder Index ==========
+# Keeps the images of a folder ordered by mtime, so the latest one is the last
+# element of a sorted list. The folder is read with one os.scandir pass, then
+# kept current by add()/discard() calls (the Firebase sync step, the watchdog
+# observer when it is installed), which also record the folder's own mtime.
+# Every lookup stats the folder; if its mtime moved without one of those calls
+# (an entry was added, removed or renamed by someone else) the index is rebuilt.
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class ImageIndex:
+    def __init__(self, folder, extensions=IMAGE_EXTENSIONS):
+        self.folder = folder
+        self.extensions = extensions
+        self._lock = threading.Lock()
+        self._by_name = {}  # name -> mtime_ns
+        self._ordered = []  # sorted [(mtime_ns, name)]
+        self._folder_mtime = None
+        self._observer = None
+        self.rescans = 0
+
+    def _is_image(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def _folder_stat(self):
+        try:
+            return os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def _rescan_locked(self):
+        by_name = {}
+        folder_mtime = self._folder_stat()
+        if folder_mtime is not None:
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if self._is_image(entry.name) and entry.is_file():
+                        by_name[entry.name] = entry.stat().st_mtime_ns
+        self._by_name = by_name
+        self._ordered = sorted((mtime, name) for name, mtime in by_name.items())
+        self._folder_mtime = folder_mtime
+        self.rescans += 1
+
+    def _ensure_current_locked(self):
+        if self._folder_mtime is None or self._folder_stat() != self._folder_mtime:
+            self._rescan_locked()
+
+    def _remove_locked(self, name):
+        mtime = self._by_name.pop(name, None)
+        if mtime is not None:
+            i = bisect.bisect_left(self._ordered, (mtime, name))
+            if i < len(self._ordered) and self._ordered[i] == (mtime, name):
+                del self._ordered[i]
+
+    def add(self, path):
+        """Record a file that was created or modified in the folder"""
+        name = os.path.basename(path)
+        if not self._is_image(name):
+            return
+        try:
+            mtime = os.stat(os.path.join(self.folder, name)).st_mtime_ns
+        except OSError:
+            self.discard(path)
+            return
+        with self._lock:
+            if self._folder_mtime is None:
+                return  # not built yet; the first lookup scans the folder
+            self._remove_locked(name)
+            self._by_name[name] = mtime
+            bisect.insort(self._ordered, (mtime, name))
+            self._folder_mtime = self._folder_stat()
+
+    def discard(self, path):
+        with self._lock:
+            if self._folder_mtime is None:
+                return
+            self._remove_locked(os.path.basename(path))
+            self._folder_mtime = self._folder_stat()
+
+    def latest(self):
+        """Path of the most recently modified image, or None"""
+        with self._lock:
+            self._ensure_current_locked()
+            if not self._ordered:
+                return None
+            return os.path.join(self.folder, self._ordered[-1][1])
+
+    def files(self):
+        """All image paths, sorted by file name"""
+        with self._lock:
+            self._ensure_current_locked()
+            return [os.path.join(self.folder, name) for name in sorted(self._by_name)]
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_current_locked()
+            return len(self._by_name)
+
+    def start_watching(self):
+        """Follow the folder with watchdog (inotify on Linux). Returns False if watchdog is not installed"""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return False
+        if self._observer is not None:
+            return True
+
+        index = self
+
+        class Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    index.add(event.src_path)
+
+            on_modified = on_created
+
+            def on_deleted(self, event):
+                if not event.is_directory:
+                    index.discard(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    index.discard(event.src_path)
+                    index.add(event.dest_path)
+
+        os.makedirs(self.folder, exist_ok=True)
+        self._observer = Observer()
+        self._observer.daemon = True
+        self._observer.schedule(Handler(), self.folder, recursive=False)
+        self._observer.start()
+        return True
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_image_index(folder):
+    """Shared index for a folder (one per process)"""
+    key = os.path.abspath(folder)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ImageIndex(folder)
+        return index
@@ -0,0 +1,181 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ------------------------- ジョブキュー ------------------------- #
+# POST で受け付けたらすぐにジョブ ID を返し、ワーカースレッドで実行する。
+# 状態は GET /jobs/<id> で取得する。gunicorn の別ワーカーに届いた問い合わせにも
+# 答えられるよう、state_path を指定すると状態を SQLite にも書き出す。
+# メモリ上の状態が正で、SQLite への書き出しに失敗してもジョブの進行・件数の管理は止めない。
+
+class QueueFull(Exception):
+    """待ち行列が上限に達しているときに送出する例外"""
+
+
+class JobQueue:
+    def __init__(self, name, max_workers=4, max_pending=32, retention=600, state_path=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention = retention
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"job-{name}")
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.mirror_errors = 0
+        self._run_seconds = 0.0
+        self._queue_seconds = 0.0
+
+        if state_path:
+            directory = os.path.dirname(state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(state_path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def submit(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) をジョブとして登録し、ジョブの状態 dict を返す。満杯なら QueueFull"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{self.name}: {self._pending} jobs pending")
+            self._pending += 1
+            self.submitted += 1
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "kind": self.name,
+                "status": "queued",
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._jobs[job["job_id"]] = job
+            self._purge_locked()
+            self._save_locked(job)
+            snapshot = self._view(job)
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return snapshot
+
+    def _run(self, job, fn, args, kwargs):
+        result = None
+        error = "ジョブが中断されました"
+        try:
+            with self._lock:
+                job["status"] = "running"
+                job["started_at"] = time.time()
+                self._save_locked(job)
+            result = fn(*args, **kwargs)
+            # GET /jobs/<id> で返せない結果は失敗として扱う
+            json.dumps(result)
+            error = None
+        except Exception as e:
+            result = None
+            error = str(e) or type(e).__name__
+        finally:
+            with self._lock:
+                job["finished_at"] = time.time()
+                job["started_at"] = job["started_at"] or job["finished_at"]
+                job["result"] = result
+                job["error"] = error
+                job["status"] = "failed" if error else "done"
+                self._pending -= 1
+                if error:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                self._queue_seconds += job["started_at"] - job["submitted_at"]
+                self._run_seconds += job["finished_at"] - job["started_at"]
+                self._save_locked(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._view(job)
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                except sqlite3.Error as e:
+                    print(f"⚠ ジョブ状態の読み込みに失敗 ({self.name}): {e}")
+                    row = None
+                if row is not None:
+                    return self._view(json.loads(row[0]))
+        return None
+
+    def _view(self, job):
+        now = time.time()
+        submitted, started, finished = job["submitted_at"], job["started_at"], job["finished_at"]
+        view = dict(job)
+        view["timing"] = {
+            "queued_ms": round(((started or now) - submitted) * 1000, 1),
+            "run_ms": round(((finished or now) - started) * 1000, 1) if started else None,
+            "total_ms": round(((finished or now) - submitted) * 1000, 1),
+        }
+        return view
+
+    def _save_locked(self, job):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data, updated_at) VALUES (?, ?, ?)",
+                (job["job_id"], json.dumps(job, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            # 他のワーカーからは見えなくなるだけで、このワーカーでは引き続き答えられる
+            self._mirror_failed_locked(e)
+
+    def _mirror_failed_locked(self, error):
+        self.mirror_errors += 1
+        print(f"⚠ ジョブ状態の書き出しに失敗 ({self.name}): {error}")
+        try:
+            self._conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _purge_locked(self):
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self._conn is not None:
+            try:
+                self._conn.execute("DELETE FROM jobs WHERE updated_at < ?", (cutoff,))
+            except sqlite3.Error as e:
+                self._mirror_failed_locked(e)
+
+    def stats(self):
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "workers": self.max_workers,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "mirror_errors": self.mirror_errors,
+                "avg_queue_ms": round(self._queue_seconds / finished * 1000, 1) if finished else None,
+                "avg_run_ms": round(self._run_seconds / finished * 1000, 1) if finished else None,
+            }
@@ -0,0 +1,194 @@
+"""
+バックエンドの負荷試験ハーネス
+
+ORS / Overpass はローカルスタブ (ors_stub.py)、Firebase Storage はローカルフォルダ
+（FIREBASE_BUCKET_DIR）に差し替えて gunicorn でサーバーを起動し、
+同時接続数 10 / 50 / 200 でのスループットと p50 / p95 / p99 を表示する。
+
+    python loadtest.py                              # gthread ワーカー（gunicorn.conf.py の既定）
+    python loadtest.py --worker-class sync          # 比較用: 1 ワーカー 1 リクエスト
+    python loadtest.py --endpoint detection --requests 200
+    python loadtest.py --endpoint detection --result-cache   # 判定結果キャッシュを有効にして比較
+
+detection は --images 枚のアップロードを storagePath で順番に指定する。判定結果キャッシュは
+既定で無効（DETECTION_RESULT_CACHE_SIZE=0）にし、毎回デコードと検出を行うコストを計測する。
+"""
+import argparse
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from ors_stub import start_stub
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_marker_image(path, ids=(0, 1)):
+    """ArUco マーカーを並べたテスト画像を作る"""
+    import cv2
+    import numpy as np
+
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
+    canvas = np.full((600, 400 + 300 * len(ids), 3), 255, dtype=np.uint8)
+    for i, marker_id in enumerate(ids):
+        marker = cv2.aruco.generateImageMarker(dictionary, marker_id, 200)
+        x = 100 + 300 * i
+        canvas[200:400, x:x + 200] = cv2.cvtColor(marker, cv2.COLOR_GRAY2BGR)
+    cv2.imwrite(path, canvas)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def navigation_body():
+    # 結果キャッシュに当たらないよう毎回少しずらす
+    return {
+        "currentLocation": {"lat": 35.46 + random.uniform(0, 0.01), "lon": 135.39 + random.uniform(0, 0.01)},
+        "endLocation": {"lat": 35.48, "lon": 135.41},
+        "tags": ["shop=supermarket", "amenity=pharmacy"],
+        "format": "polyline",
+    }
+
+
+def run_level(base_url, endpoint, concurrency, total, uploads=()):
+    local = threading.local()
+
+    def one(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        t0 = time.perf_counter()
+        try:
+            if endpoint == "navigation":
+                r = session.post(f"{base_url}/run-navigation", json=navigation_body(), timeout=120)
+            else:
+                # 同じ画像の判定が同時に走って 1 回にまとめられないよう、アップロードを順番に指定する
+                body = {"storagePath": uploads[i % len(uploads)]}
+                r = session.post(f"{base_url}/run-detection", json=body, timeout=120)
+            ok = r.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - t0, ok
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - wall_start
+
+    latencies = [t for t, ok in results if ok]
+    errors = sum(1 for _, ok in results if not ok)
+    if not latencies:
+        print(f"c={concurrency:<4} all {total} requests failed")
+        return
+    print(
+        f"c={concurrency:<4} n={total:<5} errors={errors:<4} "
+        f"rps={len(latencies) / wall:8.1f}  "
+        f"p50={percentile(latencies, 50) * 1000:8.1f} ms  "
+        f"p95={percentile(latencies, 95) * 1000:8.1f} ms  "
+        f"p99={percentile(latencies, 99) * 1000:8.1f} ms  "
+        f"mean={statistics.mean(latencies) * 1000:8.1f} ms"
+    )
+
+
+def wait_for_server(base_url, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            requests.get(f"{base_url}/stats", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoint", choices=["navigation", "detection"], default="navigation")
+    parser.add_argument("--levels", default="10,50,200", help="同時接続数（カンマ区切り）")
+    parser.add_argument("--requests", type=int, default=400, help="各レベルでのリクエスト数")
+    parser.add_argument("--latency", type=float, default=0.05, help="スタブ ORS / Overpass の応答遅延（秒）")
+    parser.add_argument("--firebase-latency", type=float, default=0.05, help="ローカルバケットの応答遅延（秒）")
+    parser.add_argument("--worker-class", default=None, help="gunicorn のワーカークラス（既定は gunicorn.conf.py）")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--images", type=int, default=20, help="detection で順番に判定するアップロード画像の枚数")
+    parser.add_argument("--result-cache", action="store_true", help="判定結果キャッシュを有効にする（既定は無効）")
+    parser.add_argument("--threads", type=int, default=None, help="ワーカーあたりのスレッド数（sync では 1）")
+    args = parser.parse_args()
+    if args.threads is None:
+        # gunicorn は threads > 1 だと sync 指定でも gthread に切り替えるので比較時は 1 にする
+        args.threads = 1 if args.worker_class == "sync" else 32
+
+    stub, stub_url, counter = start_stub(latency=args.latency)
+    work_dir = tempfile.mkdtemp(prefix="ebike-loadtest-")
+    bucket_dir = os.path.join(work_dir, "bucket")
+    os.makedirs(os.path.join(bucket_dir, "uploads"))
+    uploads = []
+    for i in range(args.images):
+        name = f"uploads/{1700000000000 + i}_photo{i}.jpg"
+        # 画像ごとに内容（マーカー ID）を変えて、内容ハッシュのキャッシュキーも別々にする
+        write_marker_image(os.path.join(bucket_dir, name), ids=(i % 50, (i + 1) % 50))
+        uploads.append(name)
+
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        ORS_BASE_URL=stub_url,
+        OVERPASS_URL=f"{stub_url}/api/interpreter",
+        FIREBASE_BUCKET_DIR=bucket_dir,
+        FIREBASE_BUCKET_LATENCY=str(args.firebase_latency),
+        ROUTE_CACHE_PATH="",
+        POI_INDEX_PATH="",
+        POI_REFRESH_INTERVAL="0",
+        JOB_STATE_PATH=os.path.join(work_dir, "jobs.sqlite3"),
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_ACCESSLOG="",
+    )
+    if not args.result_cache:
+        env["DETECTION_RESULT_CACHE_SIZE"] = "0"
+    if args.worker_class:
+        env["GUNICORN_WORKER_CLASS"] = args.worker_class
+
+    cmd = [sys.executable, "-m", "gunicorn", "-c", os.path.join(BASE_DIR, "gunicorn.conf.py"), "server:app"]
+    proc = subprocess.Popen(cmd, cwd=work_dir, env=dict(env, PYTHONPATH=BASE_DIR),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_server(base_url, proc)
+        print(f"endpoint={args.endpoint} result_cache={'on' if args.result_cache else 'off'} worker_class={args.worker_class or 'default'} "
+              f"workers={args.workers} threads={args.threads} upstream latency={args.latency * 1000:.0f} ms")
+        for level in [int(x) for x in args.levels.split(",")]:
+            run_level(base_url, args.endpoint, level, max(args.requests, level), uploads)
+        print(f"upstream calls: {counter.paths}")
+        print(f"detection results (1 worker): {requests.get(f'{base_url}/stats', timeout=5).json().get('detection_results')}")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        stub.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# ------------------------- 生成した地図 HTML の保存先 ------------------------- #
+# maps/ 以下の map_*.html を合計サイズと経過時間の上限つきで管理する。
+# 直近に生成したものはメモリにも持ち、/get-map でディスクを読まずに返す。
+# gunicorn の他のワーカーが書いたファイルもあるので、索引に無い名前はディレクトリを見て確認し、
+# スイーパーも毎回ディレクトリを読み直してから削除する。
+
+class MapStore:
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, max_age=6 * 3600,
+                 memory_bytes=32 * 1024 * 1024, prefix="map_", suffix=".html"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.memory_bytes = memory_bytes
+        self.prefix = prefix
+        self.suffix = suffix
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # filename -> (size, created_at)。古い順（LRU）
+        self._memory = OrderedDict()  # filename -> bytes
+        self._memory_size = 0
+        self._total_bytes = 0
+        self._thread = None
+
+        self.evictions = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        scanned_at = time.time()
+        found = self._scan()
+        with self._lock:
+            self._sync_locked(found, scanned_at)
+
+    def _is_artifact(self, filename):
+        return (os.path.basename(filename) == filename
+                and filename.startswith(self.prefix) and filename.endswith(self.suffix))
+
+    def _scan(self):
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and self._is_artifact(entry.name):
+                    st = entry.stat()
+                    found.append((st.st_mtime, entry.name, st.st_size))
+        found.sort()
+        return found
+
+    def _sync_locked(self, found, scanned_at):
+        """ディレクトリの内容に索引を合わせる（既知のファイルは LRU の順番を保つ）"""
+        on_disk = {name: (size, mtime) for mtime, name, size in found}
+        # 読み直している間に put したものは残す
+        gone = [name for name, (_, created_at) in self._entries.items()
+                if name not in on_disk and created_at < scanned_at]
+        for name in gone:
+            self._drop(name)
+        for name, (size, mtime) in on_disk.items():
+            entry = self._entries.get(name)
+            if entry is None:
+                self._entries[name] = (size, mtime)
+                self._total_bytes += size
+            elif entry[0] != size:
+                # 他のワーカーが書き直した
+                self._entries[name] = (size, entry[1])
+                self._total_bytes += size - entry[0]
+                data = self._memory.pop(name, None)
+                if data is not None:
+                    self._memory_size -= len(data)
+
+    def _register(self, filename):
+        """他のワーカーが書いたファイルを索引に加える。無ければ False"""
+        try:
+            st = os.stat(os.path.join(self.directory, filename))
+        except OSError:
+            return False
+        with self._lock:
+            if filename not in self._entries:
+                self._entries[filename] = (st.st_size, st.st_mtime)
+                self._total_bytes += st.st_size
+        return True
+
+    def put(self, filename, html):
+        data = html.encode("utf-8") if isinstance(html, str) else html
+        path = os.path.join(self.directory, filename)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old = self._entries.pop(filename, None)
+            if old is not None:
+                self._total_bytes -= old[0]
+            self._entries[filename] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self._remember(filename, data)
+            self._evict_locked()
+
+    def __contains__(self, filename):
+        if not self._is_artifact(filename):
+            return False
+        return os.path.isfile(os.path.join(self.directory, filename))
+
+    def get(self, filename):
+        if not self._is_artifact(filename):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            known = filename in self._entries
+        if not known and not self._register(filename):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if filename not in self._entries:
+                # 登録の直後にスイーパーが削除した
+                self.misses += 1
+                return None
+            self._entries.move_to_end(filename)
+            data = self._memory.get(filename)
+            if data is not None:
+                self._memory.move_to_end(filename)
+                self.memory_hits += 1
+                return data
+
+        try:
+            with open(os.path.join(self.directory, filename), "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._drop(filename)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        return data
+
+    def _remember(self, filename, data):
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(filename, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[filename] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_size -= len(dropped)
+
+    def _drop(self, filename):
+        entry = self._entries.pop(filename, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+        data = self._memory.pop(filename, None)
+        if data is not None:
+            self._memory_size -= len(data)
+
+    def _delete(self, filename):
+        self._drop(filename)
+        try:
+            os.remove(os.path.join(self.directory, filename))
+        except OSError:
+            pass
+        self.evictions += 1
+
+    def _evict_locked(self):
+        now = time.time()
+        if self.max_age > 0:
+            expired = [name for name, (_, created_at) in self._entries.items() if now - created_at > self.max_age]
+            for name in expired:
+                self._delete(name)
+        while self._total_bytes > self.max_bytes and self._entries:
+            self._delete(next(iter(self._entries)))
+
+    def sweep(self):
+        scanned_at = time.time()
+        found = self._scan()
+        with self._lock:
+            self._sync_locked(found, scanned_at)
+            before = self.evictions
+            self._evict_locked()
+            return self.evictions - before
+
+    def start_sweeper(self, interval=60):
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.sweep()
+
+        self._thread = threading.Thread(target=loop, name="map-sweeper", daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "bytes": self._total_bytes,
+                "memory_files": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "evictions": self.evictions,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
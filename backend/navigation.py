@@ -1,183 +1,593 @@
 import argparse
 import json
+import os
 import requests
 import sys
 import random
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import folium
 from folium import Popup
 import openrouteservice
 from openrouteservice import convert
 
-# ------------------------- 引数解析 ------------------------- #
-parser = argparse.ArgumentParser()
-parser.add_argument("--tags", type=str, default="", help="例: amenity=cafe")
-parser.add_argument("--output", type=str, required=True, help="出力するHTMLファイルパス")
-parser.add_argument("--currentLocation", type=str, required=True)
-parser.add_argument("--endLocation", type=str, required=True)
-parser.add_argument("--random_route", action="store_true", help="ルート上にランダム寄り道ピンを追加する")
-args = parser.parse_args()
+from poi_index import PoiStore
+from road_snap import SnapCache, snap_to_polyline
+from route_geometry import encode_polyline, linestring, simplify
+from route_cache import DirectionsCache
+
+# ------------------------- 設定 ------------------------- #
+ORS_API_KEY = os.environ.get("ORS_API_KEY", "5b3ce3597851110001cf6248b9ea1dfdfdb7416eb962ef2ad2bd129e")
+ORS_BASE_URL = os.environ.get("ORS_BASE_URL", "https://api.openrouteservice.org")
+ORS_PROFILE = "cycling-regular"  # または "driving-car"
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "http://overpass-api.de/api/interpreter")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 空文字ならディスク層を使わずメモリのみでキャッシュする
+ROUTE_CACHE_PATH = os.environ.get("ROUTE_CACHE_PATH", os.path.join(BASE_DIR, "cache", "directions.sqlite3"))
+ROUTE_CACHE_TTL = int(os.environ.get("ROUTE_CACHE_TTL", 7 * 24 * 3600))
+ORS_TIMEOUT = float(os.environ.get("ORS_TIMEOUT", 10))  # 1回の ORS 呼び出しのタイムアウト（秒）
+ROUTE_MAX_WORKERS = int(os.environ.get("ROUTE_MAX_WORKERS", 6))  # 1リクエストあたりの区間ルートの同時取得数
+# "multi": 全経由地を1回の directions で取得（失敗時のみ区間ごと）/ "legs": 常に区間ごと
+ROUTE_MODE = os.environ.get("ROUTE_MODE", "multi")
+# "ors": ORS snap API でスナップ（失敗時は基礎ルートへ射影）/ "local": 基礎ルートへの射影のみ
+SNAP_MODE = os.environ.get("SNAP_MODE", "ors")
+SNAP_RADIUS = int(os.environ.get("SNAP_RADIUS", 350))  # メートル
+SNAP_GEOHASH_PRECISION = int(os.environ.get("SNAP_GEOHASH_PRECISION", 7))
+SNAP_BATCH_SIZE = 50
+ROUTE_SIMPLIFY_TOLERANCE = float(os.environ.get("ROUTE_SIMPLIFY_TOLERANCE", 5))  # メートル（0 で間引かない）
+ROUTE_COORD_PRECISION = int(os.environ.get("ROUTE_COORD_PRECISION", 5))  # 小数点以下の桁数（5 でおよそ 1m）
+POI_INDEX_PATH = os.environ.get("POI_INDEX_PATH", os.path.join(BASE_DIR, "cache", "pois.json"))
+POI_REFRESH_INTERVAL = int(os.environ.get("POI_REFRESH_INTERVAL", 24 * 3600))  # 0 なら自動更新しない
 
-# ------------------------- 入力座標の解析 ------------------------- #
-start_dict = json.loads(args.currentLocation)
-start_point = (start_dict["lat"], start_dict["lon"])  # (lat, lon)
 
-end_dict = json.loads(args.endLocation)
-end_point = (end_dict["lat"], end_dict["lon"])  # (lat, lon)
+class NavigationError(Exception):
+    """ルート作成を続行できないときに送出する例外"""
 
-start_lonlat = (start_point[1], start_point[0])
-end_lonlat = (end_point[1], end_point[0])
 
 # ------------------------- OpenRouteService API ------------------------- #
-client = openrouteservice.Client(key="5b3ce3597851110001cf6248b9ea1dfdfdb7416eb962ef2ad2bd129e")
-ORS_PROFILE = "cycling-regular"  # または "driving-car"
+# クライアント（内部の requests.Session を含む）はプロセス内で使い回す
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = openrouteservice.Client(
+                    key=ORS_API_KEY,
+                    base_url=ORS_BASE_URL,
+                    timeout=ORS_TIMEOUT,
+                    retry_timeout=ORS_TIMEOUT,
+                )
+    return _client
+
+
+_snap_cache = SnapCache(precision=SNAP_GEOHASH_PRECISION)
+
+
+def get_snap_cache():
+    return _snap_cache
+
+
+_poi_store = None
+_poi_lock = threading.Lock()
+
+
+def get_poi_store():
+    global _poi_store
+    if _poi_store is None:
+        with _poi_lock:
+            if _poi_store is None:
+                _poi_store = PoiStore(POI_INDEX_PATH, OVERPASS_URL, refresh_interval=POI_REFRESH_INTERVAL)
+    return _poi_store
+
+
+def fan_out(fn, args_list):
+    """
+    fn(*args) をリクエストごとのスレッド（最大 ROUTE_MAX_WORKERS 本）で並列に呼ぶ。
+
+    戻り値は (結果, 例外) のリスト。1回の呼び出しは ORS クライアントの timeout / retry_timeout で
+    打ち切られるので、ここでは待ち時間の上限を設けない（他のリクエストの区間を待つことも無い）。
+    """
+    def call(args):
+        try:
+            return fn(*args), None
+        except Exception as e:
+            return None, e
+
+    if len(args_list) <= 1:
+        return [call(args) for args in args_list]
+    with ThreadPoolExecutor(max_workers=min(len(args_list), ROUTE_MAX_WORKERS), thread_name_prefix="ors-leg") as pool:
+        return list(pool.map(call, args_list))
+
+
+_directions_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_directions_cache():
+    global _directions_cache
+    if _directions_cache is None:
+        with _cache_lock:
+            if _directions_cache is None:
+                _directions_cache = DirectionsCache(path=ROUTE_CACHE_PATH or None, ttl=ROUTE_CACHE_TTL)
+    return _directions_cache
+
+
+def fetch_directions(points, client=None):
+    """座標列 [(lon, lat), ...] を順に通るデコード済みルート [(lon, lat), ...] を返す（キャッシュ優先）"""
+    cache = get_directions_cache()
+    coords = cache.get(ORS_PROFILE, points)
+    if coords is not None:
+        return coords
+
+    client = client or get_client()
+    res = client.directions(list(points), profile=ORS_PROFILE)
+    geometry = res['routes'][0]['geometry']
+    coords = convert.decode_polyline(geometry)['coordinates']  # lon, lat
+    cache.put(ORS_PROFILE, points, coords)
+    return coords
+
+
+def fetch_durations(points, client=None):
+    """ORS matrix で全地点間の所要時間（秒）の行列を返す。到達不能は inf"""
+    client = client or get_client()
+    res = client.distance_matrix(locations=list(points), profile=ORS_PROFILE, metrics=["duration"])
+    return [[float("inf") if d is None else d for d in row] for row in res["durations"]]
+
 
 # ------------------------- タグパース ------------------------- #
-tags_str = args.tags.strip()
-tags_list = []
-if tags_str:
-    for t in tags_str.split(","):
-        if "=" in t:
-            key, value = t.split("=", 1)
+def parse_tags(tags):
+    """"key=value,..." 形式の文字列、または {"key","value"} / "key=value" のリストを (key, value) のリストに変換"""
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.strip().split(",")
+
+    tags_list = []
+    for t in tags:
+        if isinstance(t, dict):
+            tags_list.append((str(t["key"]).strip(), str(t["value"]).strip()))
+        elif isinstance(t, (list, tuple)) and len(t) == 2:
+            tags_list.append((str(t[0]).strip(), str(t[1]).strip()))
+        elif "=" in str(t):
+            key, value = str(t).split("=", 1)
             tags_list.append((key.strip(), value.strip()))
+    return tags_list
+
+
+def parse_location(location):
+    """{"lat", "lon"} の dict または JSON 文字列を (lat, lon) に変換"""
+    if isinstance(location, str):
+        location = json.loads(location)
+    return (float(location["lat"]), float(location["lon"]))
+
 
 # ------------------------- ユーティリティ：ジッター＆スナップ ------------------------- #
-def generate_waypoints_from_route(route_coords, count=3, jitter=0.0005):
+def fetch_snapped(points, client=None):
+    """ORS snap API で (lat, lon) のリストを道路上にスナップする。スナップできなかった点は None"""
+    client = client or get_client()
+    res = client.request(
+        f"/v2/snap/{ORS_PROFILE}/json", {},
+        post_json={"locations": [[lon, lat] for lat, lon in points], "radius": SNAP_RADIUS},
+    )
+    return [(loc["location"][1], loc["location"][0]) if loc else None for loc in res["locations"]]
+
+
+def snap_points(points, route_latlon=None, mode=None, client=None):
+    """
+    (lat, lon) のリストを道路上にスナップする。戻り値は (スナップ後の点, フォールバックした点の数)。
+
+    "ors" モードでは geohash セル単位のキャッシュを引き、残りをまとめて並列に問い合わせる。
+    スナップできなかった点は route_latlon への射影（無ければ元の点）にフォールバックする。
+    """
+    mode = mode or SNAP_MODE
+    snapped = [None] * len(points)
+
+    if mode == "ors":
+        misses = []
+        for i, p in enumerate(points):
+            cached = _snap_cache.get(p)
+            if cached is not None:
+                snapped[i] = cached
+            else:
+                misses.append(i)
+
+        batches = [misses[i:i + SNAP_BATCH_SIZE] for i in range(0, len(misses), SNAP_BATCH_SIZE)]
+        outcomes = fan_out(fetch_snapped, [([points[i] for i in batch], client) for batch in batches])
+        for batch, (results, error) in zip(batches, outcomes):
+            if error is not None:
+                print(f"道路スナップ失敗: {error}")
+                continue
+            for i, s in zip(batch, results):
+                if s is not None:
+                    snapped[i] = s
+                    _snap_cache.put(points[i], s)
+
+    missing = [i for i, s in enumerate(snapped) if s is None]
+    fallbacks = len(missing) if mode == "ors" or not route_latlon else 0
+    if missing:
+        if route_latlon:
+            local = snap_to_polyline([points[i] for i in missing], route_latlon)
+        else:
+            local = [points[i] for i in missing]
+        for i, s in zip(missing, local):
+            snapped[i] = s
+    return snapped, fallbacks
+
+
+def generate_waypoints_from_route(route_coords, count=3, jitter=0.0005, client=None, rng=random):
+    """ルート上からランダムに経由地を選ぶ。戻り値は (経由地のリスト, スナップのフォールバック数)"""
     if len(route_coords) < count:
-        return []
-    sampled_points = random.sample(route_coords, count)
+        return [], 0
+    # ルート上の進行順に並べておく（並べ替えのための matrix 呼び出しが不要になる）
+    sampled_points = [route_coords[i] for i in sorted(rng.sample(range(len(route_coords)), count))]
 
     def jitter_point(p):
         return (
-            p[0] + random.uniform(-jitter, jitter),
-            p[1] + random.uniform(-jitter, jitter)
+            p[0] + rng.uniform(-jitter, jitter),
+            p[1] + rng.uniform(-jitter, jitter)
         )
 
-    def snap_to_road(point):
-        lon, lat = point[1], point[0]
-        try:
-            nearest = client.nearest(coords=(lon, lat), profile=ORS_PROFILE)
-            return (nearest["coordinates"][1], nearest["coordinates"][0])
-        except:
-            return point
-
     jittered = [jitter_point(p) for p in sampled_points]
-    snapped = [snap_to_road(p) for p in jittered]
-    return snapped
+    return snap_points(jittered, route_latlon=route_coords, client=client)
+
 
 # ------------------------- ユーティリティ：ルート取得 ------------------------- #
-def get_route_segments_with_waypoints(points):
+def get_route_segments_with_waypoints(points, client=None):
+    """
+    各区間を並列に取得して順番通りにつなげる。
+
+    戻り値は (座標リスト, 失敗した区間のリスト)。失敗した区間は飛ばして残りをつなぐ。
+    """
+    client = client or get_client()
+    legs = list(zip(points, points[1:]))
+    if not legs:
+        return [], []
+
+    outcomes = fan_out(fetch_directions, [((a, b), client) for a, b in legs])
+
     all_coords = []
-    for i in range(len(points) - 1):
+    failed_legs = []
+    for i, ((coords, exc), (a, b)) in enumerate(zip(outcomes, legs)):
+        if exc is None:
+            all_coords.extend(coords)  # lon, lat
+            continue
+        error = str(exc)
+        if isinstance(exc, (requests.exceptions.Timeout, openrouteservice.exceptions.Timeout)):
+            error = f"タイムアウト ({ORS_TIMEOUT}s)"
+        print(f"ルート取得失敗: {a} → {b}: {error}")
+        failed_legs.append({"index": i, "from": list(a), "to": list(b), "error": error})
+    return all_coords, failed_legs
+
+
+def get_base_route(start_lonlat, end_lonlat, client=None):
+    client = client or get_client()
+    try:
+        decoded_route = fetch_directions((start_lonlat, end_lonlat), client=client)  # (lon, lat)
+    except Exception as e:
+        raise NavigationError(f"基礎ルートの取得に失敗しました: {e}") from e
+    return [(lat, lon) for lon, lat in decoded_route]
+
+
+def get_full_route(points, mode=None, client=None):
+    """
+    経由地を含むルートを取得する。戻り値は (座標リスト, 失敗した区間のリスト)。
+
+    mode="multi" では全地点を1回の directions で取得し、失敗した場合のみ区間ごとの取得に切り替える。
+    """
+    mode = mode or ROUTE_MODE
+    if mode == "multi" and len(points) > 2:
         try:
-            res = client.directions([points[i], points[i + 1]], profile=ORS_PROFILE)
-            geometry = res['routes'][0]['geometry']
-            decoded = convert.decode_polyline(geometry)['coordinates']  # lon, lat
-            all_coords.extend(decoded)
+            return fetch_directions(points, client=client), []
         except Exception as e:
-            print(f"ルート取得失敗: {points[i]} → {points[i+1]}: {e}")
-    return all_coords
-
-# ------------------------- ① 一旦直行ルートを取得 ------------------------- #
-try:
-    base_route = client.directions([start_lonlat, end_lonlat], profile=ORS_PROFILE)
-    base_geometry = base_route['routes'][0]['geometry']
-    decoded_route = convert.decode_polyline(base_geometry)['coordinates']  # (lon, lat)
-    base_route_latlon = [(lat, lon) for lon, lat in decoded_route]
-except Exception as e:
-    print("基礎ルートの取得に失敗しました:", e)
-    sys.exit(1)
-
-# ------------------------- ② 経由地決定（random_route または tags） ------------------------- #
-selected_points = []
-
-if args.random_route:
-    selected_points = generate_waypoints_from_route(base_route_latlon, count=3, jitter=0.0005)
-
-elif tags_list:
-    key, value = tags_list[0]
-    center_lat = (start_point[0] + end_point[0]) / 2
-    center_lon = (start_point[1] + end_point[1]) / 2
-    radius = 3000  # meters
+            print(f"一括ルート取得失敗、区間ごとに再取得します: {e}")
+    return get_route_segments_with_waypoints(points, client=client)
+
+
+# ------------------------- ユーティリティ：経由地の並べ替え ------------------------- #
+def order_waypoints(start_lonlat, end_lonlat, waypoints, client=None):
+    """
+    ORS matrix の所要時間をもとに、出発点→全経由地→目的地が最短になる訪問順のインデックスを返す。
+
+    経由地が少ない（8以下）ときは全順列、それ以上は最近傍法。matrix が取れなければ元の順序。
+    """
+    n = len(waypoints)
+    if n < 2:
+        return list(range(n))
+    try:
+        durations = fetch_durations([start_lonlat] + list(waypoints) + [end_lonlat], client=client)
+    except Exception as e:
+        print(f"経由地の並べ替えに失敗: {e}")
+        return list(range(n))
 
+    # 行列上のインデックス: 0=出発点, 1..n=経由地, n+1=目的地
+    def cost(order):
+        path = [0] + [i + 1 for i in order] + [n + 1]
+        return sum(durations[a][b] for a, b in zip(path, path[1:]))
+
+    if n <= 8:
+        return list(min(itertools.permutations(range(n)), key=cost))
+
+    order = []
+    remaining = set(range(n))
+    current = 0
+    while remaining:
+        nxt = min(remaining, key=lambda i: durations[current][i + 1])
+        order.append(nxt)
+        remaining.remove(nxt)
+        current = nxt + 1
+    return order
+
+
+# ------------------------- ユーティリティ：ジャンル検索 ------------------------- #
+def query_overpass(tags_list, radius, center_lat, center_lon):
+    """全タグを1回の union クエリで検索する。各 POI には一致したタグを "tag" として付ける"""
+    lines = "\n".join(
+        f'      node[{key}="{value}"](around:{radius},{center_lat},{center_lon});' for key, value in tags_list
+    )
     query = f"""
     [out:json][timeout:25];
-    node[{key}="{value}"](around:{radius},{center_lat},{center_lon});
+    (
+{lines}
+    );
     out body;
     """
-    url = "http://overpass-api.de/api/interpreter"
-    try:
-        response = requests.post(url, data={"data": query}, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        points = []
-        for el in data["elements"]:
-            if "lat" in el and "lon" in el:
-                name = el.get("tags", {}).get("name", "名前なし")
-                points.append({"lat": el["lat"], "lon": el["lon"], "name": name})
-        if len(points) > 3:
-            selected_points = random.sample(points, 5)
+    response = requests.post(OVERPASS_URL, data={"data": query}, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+    points = []
+    for el in data["elements"]:
+        if "lat" in el and "lon" in el:
+            el_tags = el.get("tags", {})
+            name = el_tags.get("name", "名前なし")
+            for key, value in tags_list:
+                if el_tags.get(key) == value:
+                    points.append({"lat": el["lat"], "lon": el["lon"], "name": name, "tag": f"{key}={value}"})
+                    break
+    return points
+
+
+def search_pois(tags_list, start_point, end_point, radius=3000, count=5, rng=random):
+    """
+    指定された全タグの POI を検索し、タグが偏らないように count 件選ぶ。
+
+    ローカル POI インデックスで引けないタグだけをまとめて Overpass に問い合わせる。
+    """
+    center_lat = (start_point[0] + end_point[0]) / 2
+    center_lon = (start_point[1] + end_point[1]) / 2
+
+    points = []
+    live_tags = []
+    store = get_poi_store()
+    for key, value in tags_list:
+        found = store.around(key, value, center_lat, center_lon, radius)
+        if found is None:
+            live_tags.append((key, value))
         else:
-            selected_points = points
-    except Exception as e:
-        print("Overpassジャンル検索失敗:", e)
+            points.extend(dict(p, tag=f"{key}={value}") for p in found)
+
+    if live_tags:
+        try:
+            points.extend(query_overpass(live_tags, radius, center_lat, center_lon))
+        except Exception as e:
+            print("Overpassジャンル検索失敗:", e)
 
-# ------------------------- ③ フルルート構築 ------------------------- #
-full_points = [start_lonlat]
-if args.random_route:
-    full_points += [(p[1], p[0]) for p in selected_points]
-else:
-    full_points += [(p["lon"], p["lat"]) for p in selected_points]
-full_points.append(end_lonlat)
+    # 同じ地点が複数タグに一致した場合は最初のタグのみ残す
+    unique = {}
+    for p in points:
+        unique.setdefault((p["lat"], p["lon"]), p)
 
-final_route_coords = get_route_segments_with_waypoints(full_points)
+    # タグごとにシャッフルして交互に取り出す
+    by_tag = {}
+    for p in unique.values():
+        by_tag.setdefault(p["tag"], []).append(p)
+    for group in by_tag.values():
+        rng.shuffle(group)
+    selected_points = []
+    while len(selected_points) < count and any(by_tag.values()):
+        for group in by_tag.values():
+            if group and len(selected_points) < count:
+                selected_points.append(group.pop())
+    return selected_points
 
-# ------------------------- ④ 地図生成 ------------------------- #
 
-# 地図中心計算
-if selected_points:
-    if args.random_route:
-        mean_lat = sum(p[0] for p in selected_points) / len(selected_points)
-        mean_lon = sum(p[1] for p in selected_points) / len(selected_points)
+# ------------------------- 地図生成 ------------------------- #
+def build_map(start_point, end_point, selected_points, base_route_latlon, route_latlon, random_waypoints):
+    # 地図中心計算
+    if selected_points:
+        if random_waypoints:
+            mean_lat = sum(p[0] for p in selected_points) / len(selected_points)
+            mean_lon = sum(p[1] for p in selected_points) / len(selected_points)
+        else:
+            mean_lat = sum(p["lat"] for p in selected_points) / len(selected_points)
+            mean_lon = sum(p["lon"] for p in selected_points) / len(selected_points)
     else:
-        mean_lat = sum(p["lat"] for p in selected_points) / len(selected_points)
-        mean_lon = sum(p["lon"] for p in selected_points) / len(selected_points)
-else:
-    mean_lat, mean_lon = start_point
+        mean_lat, mean_lon = start_point
 
-m = folium.Map(location=(mean_lat, mean_lon), zoom_start=14)
+    m = folium.Map(location=(mean_lat, mean_lon), zoom_start=14)
 
+    # 出発・目的地マーカー
+    folium.Marker(start_point, tooltip="出発点", icon=folium.Icon(color="red")).add_to(m)
+    folium.Marker(end_point, tooltip="目的地", icon=folium.Icon(color="green")).add_to(m)
 
+    # 経由地マーカー
+    if random_waypoints:
+        for i, p in enumerate(selected_points):
+            folium.Marker(
+                (p[0], p[1]),
+                tooltip=f"経由地{i+1}",
+                popup=f"経由地{i+1}",
+                icon=folium.Icon(color="blue", icon="info-sign")
+            ).add_to(m)
+    else:
+        for i, p in enumerate(selected_points):
+            popup = Popup(f'{p["name"]}（{p["tag"]}）' if p.get("tag") else p["name"], max_width=300)
+            folium.Marker(
+                (p["lat"], p["lon"]),
+                tooltip=f"経由地{i+1}",
+                popup=popup,
+                icon=folium.Icon(color="blue", icon="info-sign")
+            ).add_to(m)
 
-# 出発・目的地マーカー
-folium.Marker(start_point, tooltip="出発点", icon=folium.Icon(color="red")).add_to(m)
-folium.Marker(end_point, tooltip="目的地", icon=folium.Icon(color="green")).add_to(m)
+    # 寄り道経由地ありルートを青色で描画
+    folium.PolyLine(route_latlon, color="blue", weight=4, opacity=0.7, tooltip="経由地ルート").add_to(m)
 
-# 経由地マーカー
-if args.random_route:
-    for i, p in enumerate(selected_points):
-        folium.Marker(
-            (p[0], p[1]),
-            tooltip=f"経由地{i+1}",
-            popup=f"経由地{i+1}",
-            icon=folium.Icon(color="blue", icon="info-sign")
-        ).add_to(m)
-else:
+    # 直行ルート（灰色薄線）を先に描画
+    folium.PolyLine(base_route_latlon, color="red", weight=3, opacity=0.8, tooltip="直行ルート").add_to(m)
+    return m
+
+
+# ------------------------- 軽量 JSON ペイロード ------------------------- #
+PAYLOAD_FORMATS = ("geojson", "polyline")
+
+
+def build_markers(start_point, end_point, selected_points, random_waypoints):
+    markers = [
+        {"lat": start_point[0], "lon": start_point[1], "kind": "start", "label": "出発点"},
+        {"lat": end_point[0], "lon": end_point[1], "kind": "end", "label": "目的地"},
+    ]
     for i, p in enumerate(selected_points):
-        popup = Popup(p["name"], max_width=300)
-        folium.Marker(
-            (p["lat"], p["lon"]),
-            tooltip=f"経由地{i+1}",
-            popup=popup,
-            icon=folium.Icon(color="blue", icon="info-sign")
-        ).add_to(m)
-
-# 寄り道経由地ありルートを青色で描画
-route_latlon = [(lat, lon) for lon, lat in final_route_coords]
-folium.PolyLine(route_latlon, color="blue", weight=4, opacity=0.7, tooltip="経由地ルート").add_to(m)
-
-# 直行ルート（灰色薄線）を先に描画
-folium.PolyLine(base_route_latlon, color="red", weight=3, opacity=0.8, tooltip="直行ルート").add_to(m)
-
-# ------------------------- ⑤ 保存 ------------------------- #
-m.save(args.output)
-print(f"✅ 地図作成完了: {args.output}")
+        if random_waypoints:
+            markers.append({"lat": p[0], "lon": p[1], "kind": "waypoint", "label": f"経由地{i+1}"})
+        else:
+            marker = {"lat": p["lat"], "lon": p["lon"], "kind": "waypoint", "label": f"経由地{i+1}", "name": p["name"]}
+            if p.get("tag"):
+                marker["tag"] = p["tag"]
+            markers.append(marker)
+    return markers
+
+
+def build_payload(payload_format, start_point, end_point, selected_points, base_route_latlon, route_latlon,
+                  random_waypoints):
+    """
+    地図 HTML の代わりにクライアント側で描画するためのデータを返す。
+
+    "geojson" は LineString、"polyline" は精度 5 のエンコード済みポリライン（座標は lat, lon 順）。
+    """
+    if payload_format == "polyline":
+        def encode(latlon):
+            return encode_polyline([(lon, lat) for lat, lon in latlon])
+    else:
+        encode = linestring
+
+    return {
+        "format": payload_format,
+        "base_route": encode(base_route_latlon),
+        "route": encode(route_latlon),
+        "markers": build_markers(start_point, end_point, selected_points, random_waypoints),
+    }
+
+
+# ------------------------- ルート作成 API ------------------------- #
+def plan_route(current_location, end_location=None, tags=None, random_route=False, fun_route=False,
+               output=None, payload_format=None, render_html=False, seed=None, client=None):
+    """
+    ルートを作成して地図 HTML を output に保存する。
+
+    render_html=True の場合は地図 HTML を文字列として戻り値の "html" に入れて返す。
+    seed を指定すると経由地の選び方が固定され、同じ入力から同じルートが得られる。
+
+    payload_format（"geojson" / "polyline"）を指定した場合は地図を描画せず、
+    ルートとマーカーのデータを戻り値の "payload" に入れて返す。
+
+    end_location が無い場合は出発点に戻る周回ルートとする。
+    fun_route でタグ指定が無い場合はランダム経由地を使う。
+    基礎ルートが取得できない場合は NavigationError を送出する。
+    """
+    client = client or get_client()
+    rng = random.Random(seed) if seed is not None else random
+
+    # ① 入力座標の解析
+    start_point = parse_location(current_location)  # (lat, lon)
+    end_point = parse_location(end_location) if end_location else start_point
+    start_lonlat = (start_point[1], start_point[0])
+    end_lonlat = (end_point[1], end_point[0])
+    tags_list = parse_tags(tags)
+    random_waypoints = random_route or (fun_route and not tags_list)
+
+    # ② 一旦直行ルートを取得
+    base_route_latlon = get_base_route(start_lonlat, end_lonlat, client=client)
+
+    # ③ 経由地決定（random_route または tags）
+    selected_points = []
+    snap_fallbacks = 0
+    if random_waypoints:
+        selected_points, snap_fallbacks = generate_waypoints_from_route(
+            base_route_latlon, count=3, jitter=0.0005, client=client, rng=rng
+        )
+    elif tags_list:
+        selected_points = search_pois(tags_list, start_point, end_point, rng=rng)
+        order = order_waypoints(start_lonlat, end_lonlat, [(p["lon"], p["lat"]) for p in selected_points], client=client)
+        selected_points = [selected_points[i] for i in order]
+
+    # ④ フルルート構築
+    full_points = [start_lonlat]
+    if random_waypoints:
+        full_points += [(p[1], p[0]) for p in selected_points]
+    else:
+        full_points += [(p["lon"], p["lat"]) for p in selected_points]
+    full_points.append(end_lonlat)
+
+    final_route_coords, failed_legs = get_full_route(full_points, client=client)
+    route_latlon = [(lat, lon) for lon, lat in final_route_coords]
+
+    # 描画・送信する前にルート形状を間引く
+    base_route_latlon = simplify(base_route_latlon, ROUTE_SIMPLIFY_TOLERANCE, ROUTE_COORD_PRECISION)
+    route_latlon = simplify(route_latlon, ROUTE_SIMPLIFY_TOLERANCE, ROUTE_COORD_PRECISION)
+
+    # ⑤ 地図生成・保存（または JSON ペイロード）
+    payload = None
+    html = None
+    if payload_format:
+        payload = build_payload(payload_format, start_point, end_point, selected_points,
+                                base_route_latlon, route_latlon, random_waypoints)
+    if output or render_html:
+        m = build_map(start_point, end_point, selected_points, base_route_latlon, route_latlon, random_waypoints)
+        if render_html:
+            html = m.get_root().render()
+        if output:
+            m.save(output)
+
+    return {
+        "output": output,
+        "payload": payload,
+        "html": html,
+        "waypoint_count": len(selected_points),
+        "route_points": len(route_latlon),
+        "failed_legs": failed_legs,
+        "snap_fallbacks": snap_fallbacks,
+    }
+
+
+# ------------------------- CLI ------------------------- #
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tags", type=str, default="", help="例: amenity=cafe")
+    parser.add_argument("--output", type=str, required=True, help="出力するHTMLファイルパス")
+    parser.add_argument("--currentLocation", type=str, required=True)
+    parser.add_argument("--endLocation", type=str, default=None)
+    parser.add_argument("--random_route", action="store_true", help="ルート上にランダム寄り道ピンを追加する")
+    parser.add_argument("--fun_route", action="store_true", help="寄り道ルートを作成する")
+    args = parser.parse_args(argv)
+
+    try:
+        plan_route(
+            args.currentLocation,
+            end_location=args.endLocation,
+            tags=args.tags,
+            random_route=args.random_route,
+            fun_route=args.fun_route,
+            output=args.output,
+        )
+    except NavigationError as e:
+        print(e)
+        sys.exit(1)
+    print(f"✅ 地図作成完了: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
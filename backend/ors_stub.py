@@ -0,0 +1,159 @@
+"""
+ベンチマーク用のローカル OpenRouteService スタブサーバー
+
+ORS の directions (/v2/directions/<profile>/json) に対して、
+指定された座標を直線で結んだエンコード済みポリラインを返す。
+matrix (/v2/matrix/<profile>/json) は直線距離から求めた所要時間を返す。
+snap (/v2/snap/<profile>/json) は座標を 0.0005 度の格子に丸めて返す。
+Overpass (/api/interpreter) には around / bbox 検索の範囲内に並べたダミーの POI を返す。
+latency 秒だけ応答を遅らせて実ネットワークの往復時間を模擬する。
+
+    python ors_stub.py --port 8081 --latency 0.05
+    ORS_BASE_URL=http://127.0.0.1:8081 python server.py
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from route_geometry import encode_polyline
+
+
+def interpolate(coords, steps=20):
+    line = []
+    for (lon1, lat1), (lon2, lat2) in zip(coords, coords[1:]):
+        for i in range(steps):
+            t = i / steps
+            line.append((lon1 + (lon2 - lon1) * t, lat1 + (lat2 - lat1) * t))
+    line.append(tuple(coords[-1]))
+    return line
+
+
+def haversine(a, b):
+    lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+def fake_pois(query, count=8):
+    elements = []
+    pattern = r'node\["?(\w+)"?="([^"]+)"\]\((?:around:(\d+),)?([\d.\-]+),([\d.\-]+)(?:,([\d.\-]+),([\d.\-]+))?\)'
+    for i, m in enumerate(re.finditer(pattern, query)):
+        key, value = m.group(1), m.group(2)
+        if m.group(3):
+            # around:radius,lat,lon -> 中心の周りに円形に並べる
+            radius, lat, lon = float(m.group(3)), float(m.group(4)), float(m.group(5))
+            dist = radius * 0.5 / 111000
+            angles = [2 * math.pi * (j + i / 3) / count for j in range(count)]  # タグごとに少しずらす
+            coords = [(lat + dist * math.sin(a), lon + dist * math.cos(a)) for a in angles]
+        else:
+            # south,west,north,east -> 範囲内の対角線上に並べる
+            south, west, north, east = (float(m.group(k)) for k in (4, 5, 6, 7))
+            coords = [(south + (north - south) * (j + 0.5) / count, west + (east - west) * (j + 0.5 + i / 3) / count)
+                      for j in range(count)]
+        for j, (lat, lon) in enumerate(coords):
+            elements.append({
+                "type": "node",
+                "id": i * 1000 + j,
+                "lat": lat,
+                "lon": lon,
+                "tags": {key: value, "name": f"{value} {j + 1}"},
+            })
+    return elements
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    counter = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length) if length else b""
+        if self.counter is not None:
+            self.counter.hit(self.path)
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.path.startswith("/v2/directions/"):
+            params = json.loads(raw or b"{}")
+            coords = params.get("coordinates", [])
+            if len(coords) < 2:
+                return self._send_json(400, {"error": "need at least 2 coordinates"})
+            geometry = encode_polyline(interpolate(coords))
+            return self._send_json(200, {"routes": [{"geometry": geometry}]})
+
+        if self.path.startswith("/v2/matrix/"):
+            params = json.loads(raw or b"{}")
+            locations = params.get("locations", [])
+            durations = [[haversine(a, b) / 4.0 for b in locations] for a in locations]  # 約 15 km/h
+            return self._send_json(200, {"durations": durations})
+
+        if self.path.startswith("/v2/snap/"):
+            params = json.loads(raw or b"{}")
+            locations = []
+            for lon, lat in params.get("locations", []):
+                snapped = [round(lon / 0.0005) * 0.0005, round(lat / 0.0005) * 0.0005]
+                locations.append({"location": snapped, "snapped_distance": haversine((lon, lat), snapped)})
+            return self._send_json(200, {"locations": locations})
+
+        if self.path.startswith("/api/interpreter"):
+            query = parse_qs(raw.decode("utf-8")).get("data", [""])[0]
+            return self._send_json(200, {"elements": fake_pois(query)})
+
+        return self._send_json(404, {"error": f"unknown path {self.path}"})
+
+
+class RequestCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.paths = {}
+
+    def hit(self, path):
+        with self.lock:
+            key = path.split("?")[0]
+            self.paths[key] = self.paths.get(key, 0) + 1
+
+    def total(self):
+        with self.lock:
+            return sum(self.paths.values())
+
+
+def start_stub(port=0, latency=0.0):
+    """スタブをバックグラウンドスレッドで起動し (server, base_url, counter) を返す"""
+    counter = RequestCounter()
+    handler = type("Handler", (StubHandler,), {"latency": latency, "counter": counter})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, base_url, counter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="応答遅延（秒）")
+    args = parser.parse_args()
+
+    server, base_url, _ = start_stub(args.port, args.latency)
+    print(f"ORS stub listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
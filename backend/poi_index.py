@@ -0,0 +1,283 @@
+"""
+ローカル POI インデックス
+
+Overpass のダンプ（[out:json] の elements）からタグ別・格子セル別のインデックスを作り、
+around 検索（半径 r メートル以内）をネットワークなしで返す。
+
+    # Overpass から対象エリアを取得してインデックスを作成
+    python poi_index.py --output cache/pois.json
+    # 既存のダンプファイルから作成（対象エリアは省略するとダンプの範囲）
+    python poi_index.py --output cache/pois.json dump1.json dump2.json
+    python poi_index.py --output cache/pois.json --area 35.40,135.25,35.56,135.50 dump1.json
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+
+import requests
+
+# 東舞鶴周辺（south, west, north, east）
+DEFAULT_AREA = (35.40, 135.25, 35.56, 135.50)
+
+# フロントエンド（TagSelector.js）で選べるタグ
+DEFAULT_TAGS = [
+    ("historic", "monument"), ("historic", "memorial"), ("historic", "castle"),
+    ("tourism", "museum"), ("tourism", "attraction"),
+    ("amenity", "restaurant"), ("amenity", "cafe"), ("amenity", "fast_food"),
+    ("shop", "convenience"), ("shop", "supermarket"), ("amenity", "pharmacy"),
+    ("leisure", "park"), ("tourism", "hotel"), ("amenity", "toilets"),
+]
+
+METERS_PER_DEGREE = 111320.0
+
+
+class PoiIndex:
+    """(key, value) ごとに緯度経度の格子セルで POI を分けて持つ"""
+
+    def __init__(self, tags=None, area=None, cell_size=0.01, built_at=None):
+        self.cell_size = cell_size  # 度（約 1.1km）
+        self.area = tuple(area) if area else None
+        self.tags = set(tags) if tags else set()
+        self.built_at = built_at or time.time()
+        self.count = 0
+        self._buckets = {}  # (key, value) -> {(ix, iy): [poi, ...]}
+
+    @classmethod
+    def from_elements(cls, elements, tags=None, area=None, **kwargs):
+        """
+        Overpass の elements からインデックスを作る。
+
+        tags を省略した場合は DEFAULT_TAGS、area を省略した場合は elements の範囲（south, west, north, east）を対象にする。
+        """
+        tags = tags or DEFAULT_TAGS
+        if not area:
+            area = elements_bounds(elements)
+        index = cls(tags=tags, area=area, **kwargs)
+        wanted = set(tags)
+        for el in elements:
+            if "lat" not in el or "lon" not in el:
+                continue
+            el_tags = el.get("tags", {})
+            poi = {
+                "id": el.get("id"),
+                "lat": el["lat"],
+                "lon": el["lon"],
+                "name": el_tags.get("name", "名前なし"),
+            }
+            matched = False
+            for key, value in el_tags.items():
+                if (key, value) not in wanted:
+                    continue
+                index._add(key, value, poi)
+                matched = True
+            if matched:
+                index.count += 1
+        return index
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size)))
+
+    def _add(self, key, value, poi):
+        cells = self._buckets.setdefault((key, value), {})
+        cells.setdefault(self._cell(poi["lat"], poi["lon"]), []).append(poi)
+
+    def covers(self, key, value, lat, lon, radius=0):
+        """検索円（中心 (lat, lon)、半径 radius メートル）全体がインデックスの対象エリアに入っているか"""
+        if (key, value) not in self.tags or self.area is None:
+            return False
+        dlat = radius / METERS_PER_DEGREE
+        dlon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        south, west, north, east = self.area
+        return south <= lat - dlat and lat + dlat <= north and west <= lon - dlon and lon + dlon <= east
+
+    def around(self, key, value, lat, lon, radius):
+        """
+        (lat, lon) から radius メートル以内の POI のリストを返す。
+
+        このインデックスが対象外のタグ・エリアなら None（呼び出し側でライブ検索にフォールバックする）。
+        """
+        if not self.covers(key, value, lat, lon, radius):
+            return None
+        cells = self._buckets.get((key, value), {})
+        if not cells:
+            return []
+
+        cos_lat = math.cos(math.radians(lat))
+        dlat = radius / METERS_PER_DEGREE
+        dlon = radius / (METERS_PER_DEGREE * max(cos_lat, 1e-6))
+        min_x, min_y = self._cell(lat - dlat, lon - dlon)
+        max_x, max_y = self._cell(lat + dlat, lon + dlon)
+        r2 = (radius / METERS_PER_DEGREE) ** 2
+
+        results = []
+        for ix in range(min_x, max_x + 1):
+            for iy in range(min_y, max_y + 1):
+                for poi in cells.get((ix, iy), ()):
+                    dy = poi["lat"] - lat
+                    dx = (poi["lon"] - lon) * cos_lat
+                    if dx * dx + dy * dy <= r2:
+                        results.append(poi)
+        return results
+
+    def to_dict(self):
+        pois = {}
+        for (key, value), cells in self._buckets.items():
+            for bucket in cells.values():
+                for poi in bucket:
+                    entry = pois.setdefault(id(poi), {"type": "node", "id": poi["id"], "lat": poi["lat"],
+                                                      "lon": poi["lon"], "tags": {"name": poi["name"]}})
+                    entry["tags"][key] = value
+        return {
+            "built_at": self.built_at,
+            "area": list(self.area) if self.area else None,
+            "tags": sorted([list(t) for t in self.tags]),
+            "elements": list(pois.values()),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls.from_elements(
+            data["elements"],
+            tags=[tuple(t) for t in data["tags"]],
+            area=data.get("area"),
+            built_at=data.get("built_at"),
+        )
+
+
+def elements_bounds(elements):
+    """elements の座標を囲む (south, west, north, east)。座標が無ければ None"""
+    points = [(el["lat"], el["lon"]) for el in elements if "lat" in el and "lon" in el]
+    if not points:
+        return None
+    lats, lons = zip(*points)
+    return (min(lats), min(lons), max(lats), max(lons))
+
+
+def build_overpass_query(tags, area, timeout=120):
+    south, west, north, east = area
+    lines = [f'  node["{key}"="{value}"]({south},{west},{north},{east});' for key, value in tags]
+    return f"[out:json][timeout:{timeout}];\n(\n" + "\n".join(lines) + "\n);\nout body;\n"
+
+
+def fetch_overpass_elements(overpass_url, tags, area, timeout=180):
+    response = requests.post(overpass_url, data={"data": build_overpass_query(tags, area)}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()["elements"]
+
+
+class PoiStore:
+    """
+    ディスクに保存した PoiIndex を読み込み、バックグラウンドで定期的に作り直す。
+
+    作り直し中も古いインデックスで検索でき、完成したら参照を差し替える。
+    """
+
+    def __init__(self, path, overpass_url, tags=None, area=None, refresh_interval=24 * 3600):
+        self.path = path
+        self.overpass_url = overpass_url
+        self.tags = list(tags or DEFAULT_TAGS)
+        self.area = tuple(area or DEFAULT_AREA)
+        self.refresh_interval = refresh_interval
+        self.index = None
+        self.last_error = None
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.index = PoiIndex.from_dict(json.load(f))
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            print(f"POI インデックスの読み込みに失敗: {e}")
+            return False
+
+    def is_stale(self):
+        return self.index is None or time.time() - self.index.built_at > self.refresh_interval
+
+    def refresh(self):
+        with self._refresh_lock:
+            try:
+                elements = fetch_overpass_elements(self.overpass_url, self.tags, self.area)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"POI インデックスの更新に失敗: {e}")
+                return False
+            index = PoiIndex.from_elements(elements, tags=self.tags, area=self.area)
+            if self.path:
+                save_index(index, self.path)
+            self.index = index
+            self.last_error = None
+            print(f"✅ POI インデックス更新: {index.count} 件")
+            return True
+
+    def around(self, key, value, lat, lon, radius):
+        index = self.index
+        if index is None:
+            return None
+        return index.around(key, value, lat, lon, radius)
+
+    def start_refresher(self, check_interval=600):
+        if self._thread is not None or self.refresh_interval <= 0:
+            return
+
+        def loop():
+            while True:
+                if self.is_stale():
+                    self.refresh()
+                time.sleep(check_interval)
+
+        self._thread = threading.Thread(target=loop, name="poi-refresh", daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        index = self.index
+        return {
+            "loaded": index is not None,
+            "pois": index.count if index else 0,
+            "tags": len(index.tags) if index else 0,
+            "built_at": index.built_at if index else None,
+            "last_error": self.last_error,
+        }
+
+
+def save_index(index, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dumps", nargs="*", help="Overpass [out:json] のダンプファイル（省略時は Overpass から取得）")
+    parser.add_argument("--output", required=True, help="保存先の JSON ファイル")
+    parser.add_argument("--area", default=None,
+                        help="ダンプの対象エリア south,west,north,east（省略時はダンプに含まれる座標の範囲）")
+    parser.add_argument("--overpass-url", default=os.environ.get("OVERPASS_URL", "http://overpass-api.de/api/interpreter"))
+    args = parser.parse_args()
+
+    if args.dumps:
+        elements = []
+        for dump in args.dumps:
+            with open(dump, encoding="utf-8") as f:
+                elements.extend(json.load(f)["elements"])
+        area = tuple(float(v) for v in args.area.split(",")) if args.area else None
+        index = PoiIndex.from_elements(elements, area=area)
+    else:
+        index = PoiIndex.from_elements(
+            fetch_overpass_elements(args.overpass_url, DEFAULT_TAGS, DEFAULT_AREA),
+            tags=DEFAULT_TAGS,
+            area=DEFAULT_AREA,
+        )
+    save_index(index, args.output)
+    print(f"✅ {index.count} 件の POI を保存しました: {args.output}")
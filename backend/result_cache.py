@@ -0,0 +1,160 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+# ------------------------- ルート作成結果のキャッシュ ------------------------- #
+
+def route_request_key(current_location, end_location, tags, random_route, fun_route, response_format, precision=4):
+    """
+    /run-navigation のリクエストを正規化してハッシュ化する。
+
+    座標は precision 桁に丸め、タグは "key=value" に揃えて並べ替える。
+    """
+    def point(location):
+        if not location:
+            return None
+        return [round(float(location["lat"]), precision), round(float(location["lon"]), precision)]
+
+    normalized_tags = []
+    for t in tags or []:
+        if isinstance(t, dict):
+            normalized_tags.append(f'{t["key"]}={t["value"]}')
+        else:
+            normalized_tags.append(str(t).strip())
+
+    body = {
+        "start": point(current_location),
+        "end": point(end_location),
+        "tags": sorted(set(normalized_tags)),
+        "random_route": bool(random_route),
+        "fun_route": bool(fun_route),
+        "format": response_format,
+    }
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SingleFlightCache:
+    """
+    TTL・件数上限つきの LRU キャッシュ。
+
+    同じキーの計算が実行中なら、後から来た呼び出しは新たに計算せずその結果を待つ。
+    """
+
+    def __init__(self, ttl=600, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (created_at, value)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def get_or_compute(self, key, compute, is_valid=None):
+        """
+        キャッシュ済みの値があれば返し、無ければ compute() を1回だけ実行する。
+
+        is_valid(value) が False を返したキャッシュ値は破棄して計算し直す。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if time.time() - created_at <= self.ttl and (is_valid is None or is_valid(value)):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+            }
+
+
+class ArrayLRU:
+    """
+    numpy 配列を合計バイト数の上限つきで保持する LRU キャッシュ。
+
+    同じ画像を判定し直すときに、デコード済みのグレースケール画像を使い回すために使う。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> array
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            array = self._entries.get(key)
+            if array is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return array
+
+    def put(self, key, array):
+        if array.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = array
+            self._bytes += array.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
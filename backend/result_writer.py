@@ -0,0 +1,109 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+# ========== Result Image Writer ==========
+# Draws the detected markers, optionally downscales and writes result_* images on
+# a background thread so detection latency does not include the encode and the
+# disk write. The queue is bounded; when it is full the image is dropped.
+
+RESULT_IMAGE_QUEUE = int(os.environ.get("RESULT_IMAGE_QUEUE", 32))
+RESULT_IMAGE_MAX_SIDE = int(os.environ.get("RESULT_IMAGE_MAX_SIDE", 1280))  # 0 keeps the original size
+RESULT_IMAGE_QUALITY = int(os.environ.get("RESULT_IMAGE_QUALITY", 85))
+
+
+def render_result_image(image, corners, ids, max_side=None):
+    if ids is not None:
+        cv2.aruco.drawDetectedMarkers(image, corners, ids)
+    height, width = image.shape[:2]
+    if max_side and max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return image
+
+
+def write_image(path, image, jpeg_quality=95):
+    ext = os.path.splitext(path)[1].lower()
+    params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if ext in (".jpg", ".jpeg") else []
+    # Unique per process and thread: gunicorn workers can write the same result_* name
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp{ext}"
+    if not cv2.imwrite(tmp_path, image, params):
+        raise OSError(f"could not write {path}")
+    os.replace(tmp_path, path)
+
+
+class ResultImageWriter:
+    def __init__(self, max_queue=RESULT_IMAGE_QUEUE, max_side=RESULT_IMAGE_MAX_SIDE, jpeg_quality=RESULT_IMAGE_QUALITY):
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._write_seconds = 0.0
+
+    def submit(self, path, image, corners=None, ids=None):
+        """Queue an image for writing. The caller must not modify it afterwards. Returns False if dropped"""
+        self._start()
+        try:
+            self._queue.put_nowait((path, image, corners, ids))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            path, image, corners, ids = self._queue.get()
+            t0 = time.perf_counter()
+            try:
+                write_image(path, render_result_image(image, corners, ids, self.max_side), self.jpeg_quality)
+                with self._lock:
+                    self.written += 1
+                    self._write_seconds += time.perf_counter() - t0
+            except Exception as e:
+                print(f"Failed to write result image {path}: {e}")
+                with self._lock:
+                    self.failed += 1
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued image has been written"""
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "avg_write_ms": round(self._write_seconds / self.written * 1000, 1) if self.written else None,
+            }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_result_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ResultImageWriter()
+    return _writer
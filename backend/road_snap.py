@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# ------------------------- geohash ------------------------- #
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lon, precision=7):
+    """(lat, lon) を geohash 文字列に変換する（precision=7 でおよそ 150m 四方）"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch |= 1 << (4 - bit)
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        if bit < 4:
+            bit += 1
+        else:
+            chars.append(_BASE32[ch])
+            bit = 0
+            ch = 0
+    return "".join(chars)
+
+
+# ------------------------- スナップ結果キャッシュ ------------------------- #
+class SnapCache:
+    """geohash セル -> スナップ後の (lat, lon)。件数上限付き LRU"""
+
+    def __init__(self, precision=7, max_entries=10000):
+        self.precision = precision
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cell(self, point):
+        return geohash_encode(point[0], point[1], self.precision)
+
+    def get(self, point):
+        key = self.cell(point)
+        with self._lock:
+            snapped = self._entries.get(key)
+            if snapped is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return snapped
+
+    def put(self, point, snapped):
+        key = self.cell(point)
+        with self._lock:
+            self._entries[key] = snapped
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+# ------------------------- ローカルスナップ（ポリラインへの射影） ------------------------- #
+def snap_to_polyline(points, polyline):
+    """
+    各点をデコード済みポリライン上の最も近い点に射影する（ネットワーク呼び出しなし）。
+
+    points, polyline はいずれも (lat, lon) の並び。緯度に応じて経度方向を縮めた平面近似で計算する。
+    """
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    line = np.asarray(polyline, dtype=float).reshape(-1, 2)
+    if len(pts) == 0 or len(line) == 0:
+        return [tuple(p) for p in pts]
+    if len(line) == 1:
+        return [tuple(line[0])] * len(pts)
+
+    scale = np.array([1.0, np.cos(np.radians(line[:, 0].mean()))])
+    a = line[:-1] * scale  # (S, 2) 区間の始点
+    ab = line[1:] * scale - a  # (S, 2)
+    p = pts * scale  # (P, 2)
+
+    ap = p[:, None, :] - a[None, :, :]  # (P, S, 2)
+    seg_len2 = np.einsum("ij,ij->i", ab, ab)
+    seg_len2[seg_len2 == 0] = 1e-18
+    t = np.clip(np.einsum("psk,sk->ps", ap, ab) / seg_len2, 0.0, 1.0)  # (P, S)
+    proj = a[None, :, :] + t[:, :, None] * ab[None, :, :]  # (P, S, 2)
+    dist2 = np.sum((proj - p[:, None, :]) ** 2, axis=2)
+    best = np.argmin(dist2, axis=1)
+
+    snapped = proj[np.arange(len(pts)), best] / scale
+    return [tuple(s) for s in snapped.tolist()]
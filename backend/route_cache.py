@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# ------------------------- ORS directions キャッシュ ------------------------- #
+# キー: (profile, 丸めた出発点, [丸めた経由地...], 丸めた到着点)
+# 値  : デコード済みポリライン [(lon, lat), ...]
+# 1段目はメモリ上の LRU、2段目は SQLite。どちらも TTL と件数上限を持つ。
+
+class DirectionsCache:
+    def __init__(self, path=None, precision=4, ttl=7 * 24 * 3600, max_memory_entries=512, max_disk_entries=20000):
+        self.precision = precision
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS directions ("
+                " key TEXT PRIMARY KEY,"
+                " coords TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_directions_accessed ON directions (accessed_at)")
+            self._conn.commit()
+
+    def make_key(self, profile, points):
+        p = self.precision
+        return "|".join([profile] + ["{:.{p}f},{:.{p}f}".format(lon, lat, p=p) for lon, lat in points])
+
+    def get(self, profile, points):
+        key = self.make_key(profile, points)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, coords = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return coords
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT coords, created_at FROM directions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if now - row[1] <= self.ttl:
+                        coords = [tuple(c) for c in json.loads(row[0])]
+                        self._conn.execute("UPDATE directions SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._conn.commit()
+                        self._remember(key, row[1], coords)
+                        self.disk_hits += 1
+                        return coords
+                    self._conn.execute("DELETE FROM directions WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, profile, points, coords):
+        key = self.make_key(profile, points)
+        now = time.time()
+        coords = [tuple(c) for c in coords]
+        with self._lock:
+            self._remember(key, now, coords)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO directions (key, coords, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(coords), now, now),
+                )
+                self._evict_disk(now)
+                self._conn.commit()
+
+    def _remember(self, key, created_at, coords):
+        self._memory[key] = (created_at, coords)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self, now):
+        self._conn.execute("DELETE FROM directions WHERE created_at < ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM directions").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM directions WHERE key IN ("
+                " SELECT key FROM directions ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM directions")
+                self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            disk_entries = None
+            if self._conn is not None:
+                disk_entries = self._conn.execute("SELECT COUNT(*) FROM directions").fetchone()[0]
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
@@ -0,0 +1,65 @@
+import numpy as np
+
+# ------------------------- ルート形状のユーティリティ ------------------------- #
+
+def encode_polyline(coords, precision=5):
+    """(lon, lat) のリストを Google ポリライン文字列にエンコードする（ORS の decode_polyline と同じ形式）"""
+    factor = 10 ** precision
+    result = []
+    prev_lat = prev_lon = 0
+    for lon, lat in coords:
+        lat_i = int(round(lat * factor))
+        lon_i = int(round(lon * factor))
+        for delta in (lat_i - prev_lat, lon_i - prev_lon):
+            value = ~(delta << 1) if delta < 0 else (delta << 1)
+            while value >= 0x20:
+                result.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            result.append(chr(value + 63))
+        prev_lat, prev_lon = lat_i, lon_i
+    return "".join(result)
+
+
+def linestring(latlon):
+    """(lat, lon) のリストを GeoJSON LineString に変換する"""
+    return {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in latlon]}
+
+
+def simplify(latlon, tolerance=5.0, precision=5):
+    """
+    Douglas–Peucker 法で (lat, lon) のリストを間引き、座標を小数 precision 桁に丸める。
+
+    tolerance はメートル単位。各区間の距離計算は NumPy でまとめて行う。
+    """
+    if len(latlon) < 3 or tolerance <= 0:
+        return [(round(lat, precision), round(lon, precision)) for lat, lon in latlon]
+
+    pts = np.asarray(latlon, dtype=float)
+    # 緯度経度をメートル単位の平面座標に近似
+    scale = np.array([111320.0, 111320.0 * np.cos(np.radians(pts[:, 0].mean()))])
+    xy = pts * scale
+
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a = xy[first]
+        ab = xy[last] - a
+        ap = xy[first + 1:last] - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(ap[:, 0], ap[:, 1])
+        else:
+            dist = np.abs(ab[0] * ap[:, 1] - ab[1] * ap[:, 0]) / length
+        index = int(np.argmax(dist))
+        if dist[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    simplified = np.round(pts[keep], precision)
+    return [tuple(p) for p in simplified.tolist()]
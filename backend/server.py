@@ -1,77 +1,167 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import subprocess
 import os
+import re
 import json
 import uuid
-import sys
 
-from ArUco_check_only import download_firebase_images, ArUcoImageDetectionSystem
+import navigation
+import aruco_detectors
+from result_writer import get_result_writer
+from aruco_pose import PoseEstimator
+from image_index import get_image_index
+from map_store import MapStore
+from result_cache import ArrayLRU, SingleFlightCache, route_request_key
+from jobs import JobQueue, QueueFull
+from ArUco_check_only import (
+    download_firebase_images, detect_blob, detect_latest_upload, get_bucket, ArUcoImageDetectionSystem,
+)
 
 app = Flask(__name__)
 CORS(app)
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 生成した地図 HTML は合計サイズ・経過時間の上限つきで保持し、古いものから削除する
+map_store = MapStore(
+    os.path.join(BASE_DIR, "maps"),
+    max_bytes=int(os.environ.get("MAP_STORE_MAX_BYTES", 200 * 1024 * 1024)),
+    max_age=int(os.environ.get("MAP_STORE_MAX_AGE", 6 * 3600)),
+    memory_bytes=int(os.environ.get("MAP_STORE_MEMORY_BYTES", 32 * 1024 * 1024)),
+)
+map_store.start_sweeper(interval=int(os.environ.get("MAP_STORE_SWEEP_INTERVAL", 60)))
+
+# 同じ内容の /run-navigation は結果を使い回し、同時に来た場合も計算は1回だけにする
+route_results = SingleFlightCache(
+    ttl=int(os.environ.get("ROUTE_RESULT_CACHE_TTL", 600)),
+    max_entries=int(os.environ.get("ROUTE_RESULT_CACHE_SIZE", 1024)),
+)
+ROUTE_REQUEST_PRECISION = int(os.environ.get("ROUTE_REQUEST_PRECISION", 4))
+
+# POI インデックスをバックグラウンドで読み込み・更新する（無ければ Overpass にフォールバック）
+navigation.get_poi_store().start_refresher()
+
+# /jobs/* で受け付けた処理はワーカースレッドで実行する。
+# 種類ごとにワーカーと待ち行列を分け、Overpass や Firebase が遅くても他方は止まらないようにする
+JOB_STATE_PATH = os.environ.get("JOB_STATE_PATH", os.path.join(BASE_DIR, "cache", "jobs.sqlite3"))
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", 600))
+JOB_RETRY_AFTER = int(os.environ.get("JOB_RETRY_AFTER", 5))
+job_queues = {
+    "navigation": JobQueue(
+        "navigation",
+        max_workers=int(os.environ.get("NAVIGATION_JOB_WORKERS", 8)),
+        max_pending=int(os.environ.get("NAVIGATION_JOB_QUEUE", 64)),
+        retention=JOB_RETENTION,
+        state_path=JOB_STATE_PATH or None,
+    ),
+    "detection": JobQueue(
+        "detection",
+        max_workers=int(os.environ.get("DETECTION_JOB_WORKERS", 2)),
+        max_pending=int(os.environ.get("DETECTION_JOB_QUEUE", 16)),
+        retention=JOB_RETENTION,
+        state_path=JOB_STATE_PATH or None,
+    ),
+}
+
+def build_navigation_response(currentLocation, endLocation, tags, random_route, fun_route, response_format, key=None):
+    """ルートを作成してレスポンスを組み立てる。key があれば経由地の選び方と地図ファイル名をそれに固定する"""
+    result = navigation.plan_route(
+        currentLocation,
+        end_location=endLocation,
+        tags=tags,
+        random_route=random_route,
+        fun_route=fun_route,
+        render_html=response_format == "html",
+        payload_format=None if response_format == "html" else response_format,
+        seed=key,
+    )
+
+    response = {
+        "status": "success",
+        "failed_legs": result["failed_legs"],
+        "snap_fallbacks": result["snap_fallbacks"],
+    }
+    if result["html"] is not None:
+        filename = f"map_{key[:32] if key else uuid.uuid4()}.html"
+        map_store.put(filename, result["html"])
+        response["filename"] = filename
+    else:
+        response.update(result["payload"])
+    return response
+
+
+def parse_navigation_request(data):
+    """リクエストを検証して (パラメータ, エラーメッセージ) を返す"""
+    if not data:
+        return None, "リクエストデータがありません。"
+
+    tags = data.get("tags", [])
+    currentLocation = data.get("currentLocation")
+    endLocation = data.get("endLocation")
+    random_route = data.get("random_route", False)
+    fun_route = data.get("fun_route", False)
+    # "html"（既定）: folium 地図を保存してファイル名を返す / "geojson", "polyline": ルートを JSON で返す
+    response_format = data.get("format", "html")
+
+    if currentLocation is None:
+        return None, "現在地の情報がありません。"
+
+    if not random_route and not fun_route and endLocation is None:
+        return None, "目的地の情報がありません。"
+
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except json.JSONDecodeError:
+            return None, "タグの形式が不正です。"
+
+    if response_format != "html" and response_format not in navigation.PAYLOAD_FORMATS:
+        return None, "レスポンス形式が不正です。"
+
+    return {
+        "currentLocation": currentLocation,
+        "endLocation": endLocation,
+        "tags": tags,
+        "random_route": random_route,
+        "fun_route": fun_route,
+        "response_format": response_format,
+    }, None
+
+
+def navigate(currentLocation, endLocation, tags, random_route, fun_route, response_format):
+    """検証済みのパラメータでルートを作成する（結果キャッシュつき）"""
+    # ランダム経由地のモード以外は入力が同じなら結果も同じなので、正規化したリクエストのハッシュで引く
+    cacheable = not random_route and not (fun_route and not tags)
+    if not cacheable:
+        return build_navigation_response(
+            currentLocation, endLocation, tags, random_route, fun_route, response_format
+        )
+
+    key = route_request_key(
+        currentLocation, endLocation, tags, random_route, fun_route, response_format,
+        precision=ROUTE_REQUEST_PRECISION,
+    )
+    return route_results.get_or_compute(
+        key,
+        lambda: build_navigation_response(
+            currentLocation, endLocation, tags, random_route, fun_route, response_format, key=key
+        ),
+        is_valid=lambda r: not r["failed_legs"] and ("filename" not in r or r["filename"] in map_store),
+    )
+
+
 @app.route("/run-navigation", methods=["POST"])
 def run_navigation():
     try:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        nav_path = os.path.join(base_dir, "navigation.py")
-        maps_dir = os.path.join(base_dir, "maps")
-        os.makedirs(maps_dir, exist_ok=True)
-
-        unique_filename = f"map_{uuid.uuid4()}.html"
-        output_filepath = os.path.join(maps_dir, unique_filename)
-
-        data = request.get_json()
-        if not data:
-            return jsonify(status="error", message="リクエストデータがありません。"), 400
-
-        tags = data.get("tags", [])
-        currentLocation = data.get("currentLocation")
-        endLocation = data.get("endLocation")
-        random_route = data.get("random_route", False)
-        fun_route = data.get("fun_route", False)
-
-        if currentLocation is None:
-            return jsonify(status="error", message="現在地の情報がありません。"), 400
-
-        if not random_route and not fun_route and endLocation is None:
-            return jsonify(status="error", message="目的地の情報がありません。"), 400
-
-        if isinstance(tags, str):
-            try:
-                tags = json.loads(tags)
-            except json.JSONDecodeError:
-                return jsonify(status="error", message="タグの形式が不正です。"), 400
-
-        if tags and isinstance(tags[0], dict):
-            tag_str = ",".join(f"{t['key']}={t['value']}" for t in tags)
-        else:
-            tag_str = ",".join(map(str, tags))
-
-        args = [
-            sys.executable,
-            nav_path,
-            "--tags", tag_str,
-            "--output", output_filepath,
-            "--currentLocation", json.dumps(currentLocation),
-        ]
-
-        if endLocation:
-            args.extend(["--endLocation", json.dumps(endLocation)])
-        if random_route:
-            args.append("--random_route")
-        if fun_route:
-            args.append("--fun_route")
-
-        subprocess.run(args, check=True, capture_output=True, text=True, encoding='utf-8')
-
-        return jsonify({"status": "success", "filename": unique_filename})
-
-    except subprocess.CalledProcessError as e:
-        print(f"❌ navigation.py の実行に失敗: {e}")
-        print(f"Stderr: {e.stderr}")
-        return jsonify(status="error", message=f"ナビゲーションスクリプトでエラーが発生しました: {e.stderr}"), 500
+        params, error = parse_navigation_request(request.get_json())
+        if error:
+            return jsonify(status="error", message=error), 400
+
+        return jsonify(navigate(**params))
+
+    except navigation.NavigationError as e:
+        print(f"❌ ルート作成に失敗: {e}")
+        return jsonify(status="error", message=f"ナビゲーションでエラーが発生しました: {e}"), 500
 
     except Exception as e:
         print(f"❌ サーバー内部エラー: {e}")
@@ -80,41 +170,143 @@ def run_navigation():
 
 @app.route("/get-map/<string:filename>")
 def get_map(filename):
-    maps_dir = os.path.join(os.path.dirname(__file__), "maps")
     if ".." in filename or filename.startswith("/"):
         return "Invalid filename", 400
 
-    file_path = os.path.join(maps_dir, filename)
-    if not os.path.exists(file_path):
+    html = map_store.get(filename)
+    if html is None:
         return "File not found", 404
 
-    return send_from_directory(maps_dir, filename)
+    return Response(html, mimetype="text/html")
 
 
-@app.route('/run-detection', methods=['POST'])
-def run_detection():
-    try:
+@app.route("/stats")
+def stats():
+    return jsonify({
+        "directions_cache": navigation.get_directions_cache().stats(),
+        "snap_cache": navigation.get_snap_cache().stats(),
+        "poi_index": navigation.get_poi_store().stats(),
+        "map_store": map_store.stats(),
+        "route_results": route_results.stats(),
+        "jobs": {kind: queue.stats() for kind, queue in job_queues.items()},
+        "aruco_detectors": aruco_detectors.stats(),
+        "result_writer": get_result_writer().stats(),
+        "detection_results": aruco_detector.result_cache.stats(),
+        "gray_images": aruco_detector.gray_cache.stats() if aruco_detector.gray_cache is not None else None,
+    })
+
+
+# "latest": 最新のアップロードだけをメモリに読み込んで判定する / "sync": uploads/ をローカルに同期してから判定する
+DETECTION_SOURCE = os.environ.get("DETECTION_SOURCE", "latest")
+if DETECTION_SOURCE != "latest":
+    # captured_photos の索引を watchdog で追従する（未インストールなら同期処理からの通知とフォルダの mtime で更新）
+    get_image_index("captured_photos").start_watching()
+
+
+# 検出器はリクエスト間で使い回す（ArUco 辞書・パラメータの構築と makedirs は起動時の1回だけ）
+# スマホ写真は長辺 ARUCO_COARSE_MAX_SIDE に縮小して先に検出する（0 で常に原寸）
+# 結果画像（result_*.jpg）はリクエストで save_result が指定されたときだけ、バックグラウンドで書き出す
+# ARUCO_POSE=1 で検出した角からマーカー間の距離・角度も求め、ARUCO_PAIR_* の範囲外なら不合格にする（aruco_pose.py）
+# 判定結果は画像の内容（Firebase の md5Hash、ローカルファイルは mtime とサイズ）ごとにキャッシュし、
+# 同じ画像の再チェックではダウンロードも OpenCV の処理もしない
+# ARUCO_GRAY_CACHE_BYTES を指定すると、デコード済みのグレースケール画像もその容量まで保持する
+ARUCO_GRAY_CACHE_BYTES = int(os.environ.get("ARUCO_GRAY_CACHE_BYTES", 0))
+aruco_detector = ArUcoImageDetectionSystem(
+    target_aruco_num=2,
+    image_folder="captured_photos",
+    coarse_max_side=int(os.environ.get("ARUCO_COARSE_MAX_SIDE", 1280)) or None,
+    save_results=False,
+    result_writer=get_result_writer(),
+    pose_estimator=PoseEstimator.from_env() if os.environ.get("ARUCO_POSE") == "1" else None,
+    result_cache=SingleFlightCache(
+        ttl=int(os.environ.get("DETECTION_RESULT_CACHE_TTL", 600)),
+        max_entries=int(os.environ.get("DETECTION_RESULT_CACHE_SIZE", 1024)),
+    ),
+    gray_cache=ArrayLRU(max_bytes=ARUCO_GRAY_CACHE_BYTES) if ARUCO_GRAY_CACHE_BYTES > 0 else None,
+)
+BIKE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+def parse_detection_request(data):
+    """リクエストを検証して (パラメータ, エラーメッセージ) を返す"""
+    data = data or {}
+    storage_path = data.get("storagePath")
+    bike_id = data.get("bikeId")
+
+    if storage_path is not None:
+        if (not isinstance(storage_path, str) or not storage_path.startswith("uploads/")
+                or storage_path.endswith("/") or ".." in storage_path.split("/")):
+            return None, "storagePath の形式が不正です。"
+
+    if bike_id is not None:
+        if not isinstance(bike_id, str) or not BIKE_ID_PATTERN.fullmatch(bike_id):
+            return None, "bikeId の形式が不正です。"
+
+    return {
+        "save_result": bool(data.get("save_result")),
+        "storage_path": storage_path,
+        "bike_id": bike_id,
+    }, None
+
+
+def detect(save_result=False, storage_path=None, bike_id=None):
+    detector = aruco_detector
+
+    if storage_path:
+        # リクエストで指定されたアップロードだけを取得して判定する（他の利用者の画像と取り違えない）
+        blob = get_bucket().get_blob(storage_path)
+        if blob is None:
+            raise UploadNotFound(f"画像が見つかりません: {storage_path}")
+        result = detect_blob(detector, blob, save_result=save_result)
+    elif bike_id:
+        # uploads/<bikeId>/ 以下の最新の画像
+        result = detect_latest_upload(detector, firebase_folder=f"uploads/{bike_id}", save_result=save_result)
+    elif DETECTION_SOURCE == "latest":
+        result = detect_latest_upload(detector, firebase_folder="uploads", save_result=save_result)
+    else:
         # Step 1: Download images from Firebase
         download_firebase_images(local_folder="captured_photos", firebase_folder="uploads")
 
         # Step 2: Run ArUco detection
-        detector = ArUcoImageDetectionSystem(
-            target_aruco_num=2,
-            image_folder="captured_photos"
-        )
-        result = detector.process_latest_image()
+        result = detector.process_latest_image(save_result=save_result)
 
-        # Step 3: Result judgment
-        is_target_met = (result.get("detected_count", 0) == 2)
+    if result is None:
+        raise UploadNotFound("判定する画像が見つかりません。")
 
-        return jsonify({
-            "status": "success",
-            "is_target_met": is_target_met,
-            "detected_count": result.get("detected_count"),
-            "target_count": result.get("target_count"),
-            "marker_ids": result.get("marker_ids"),
-            "ArUco_check": result.get("ArUco_check")
-        })
+    # Step 3: Result judgment
+    # 姿勢チェックが有効なときは ArUco_check にその結果も含まれる
+    is_target_met = (result.get("ArUco_check") == 1)
+
+    response = {
+        "status": "success",
+        "is_target_met": is_target_met,
+        "detected_count": result.get("detected_count"),
+        "target_count": result.get("target_count"),
+        "marker_ids": result.get("marker_ids"),
+        "ArUco_check": result.get("ArUco_check")
+    }
+    if "pose" in result:
+        response["pose"] = result["pose"]
+    if save_result:
+        response["result_image"] = result.get("result_image")
+    return response
+
+
+@app.route('/run-detection', methods=['POST'])
+def run_detection():
+    try:
+        params, error = parse_detection_request(request.get_json(silent=True))
+        if error:
+            return jsonify(status="error", message=error), 400
+
+        return jsonify(detect(**params))
+
+    except UploadNotFound as e:
+        return jsonify(status="error", message=str(e)), 404
 
     except Exception as e:
         print("Error during detection:", e)
@@ -122,7 +314,50 @@ def run_detection():
             "status": "error",
             "message": str(e)
         }), 500
-        
+
+
+# ------------------------- ジョブ API ------------------------- #
+# POST /jobs/navigation, /jobs/detection は受け付けるとすぐにジョブ ID を返す（202）。
+# 待ち行列が満杯なら 429。結果は GET /jobs/<job_id> で取得する。
+
+def submit_job(kind, fn, *args, **kwargs):
+    try:
+        job = job_queues[kind].submit(fn, *args, **kwargs)
+    except QueueFull:
+        response = jsonify(status="error", message="混み合っています。しばらくしてから再度お試しください。")
+        response.headers["Retry-After"] = str(JOB_RETRY_AFTER)
+        return response, 429
+
+    response = jsonify(status="accepted", job_id=job["job_id"], kind=kind, poll=f"/jobs/{job['job_id']}")
+    response.headers["Location"] = f"/jobs/{job['job_id']}"
+    return response, 202
+
+
+@app.route("/jobs/navigation", methods=["POST"])
+def submit_navigation_job():
+    params, error = parse_navigation_request(request.get_json(silent=True))
+    if error:
+        return jsonify(status="error", message=error), 400
+    return submit_job("navigation", navigate, **params)
+
+
+@app.route("/jobs/detection", methods=["POST"])
+def submit_detection_job():
+    params, error = parse_detection_request(request.get_json(silent=True))
+    if error:
+        return jsonify(status="error", message=error), 400
+    return submit_job("detection", detect, **params)
+
+
+@app.route("/jobs/<string:job_id>")
+def get_job(job_id):
+    for queue in job_queues.values():
+        job = queue.get(job_id)
+        if job is not None:
+            return jsonify(job)
+    return jsonify(status="error", message="ジョブが見つかりません。"), 404
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=True)
@@ -2,9 +2,11 @@ import 'leaflet/dist/leaflet.css';
 import './MapPage.css';
 import React, { useState, useEffect } from 'react';
 import TagSelector from './TagSelector';
+import RouteMap from './RouteMap';
 
 function MapPage() {
   const [mapUrl, setMapUrl] = useState(null);
+  const [routeData, setRouteData] = useState(null);
   const [currentLocation, setCurrentLocation] = useState(null);
   //const [randomroute, setRandomRoute] = useState(false);
 
@@ -40,12 +42,18 @@ function MapPage() {
           currentLocation,
           random_route: randomroute,
           endLocation,
+          // 地図 HTML ではなくルートとマーカーだけを受け取り、ブラウザ側で描画する
+          format: 'polyline',
         }),
       });
 
       const json = await res.json();
 
-      if (json.status === 'success' && json.filename) {
+      if (json.status === 'success' && json.route) {
+        setMapUrl(null);
+        setRouteData(json);
+      } else if (json.status === 'success' && json.filename) {
+        setRouteData(null);
         setMapUrl(`${baseUrl}/get-map/${json.filename}`);
       } else {
         alert('ナビ生成に失敗しましたmp: ' + (json.message || ''));
@@ -60,6 +68,11 @@ function MapPage() {
     <div className="map-wrapper">
       <h1 className="page-title">🌸 東舞鶴観光ナビ 🌊</h1>
       <TagSelector onRunNavigation={runNavigation} />
+      {routeData && (
+        <div className="map-container">
+          <RouteMap data={routeData} />
+        </div>
+      )}
       {mapUrl && (
         <div className="map-container">
           <iframe
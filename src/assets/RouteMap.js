@@ -0,0 +1,96 @@
+import React from 'react';
+import {
+  MapContainer,
+  TileLayer,
+  Polyline,
+  CircleMarker,
+  Tooltip,
+  Popup,
+} from 'react-leaflet';
+
+// 精度 5 のエンコード済みポリラインを [[lat, lon], ...] にデコード
+export const decodePolyline = (encoded) => {
+  const points = [];
+  let index = 0;
+  let lat = 0;
+  let lon = 0;
+
+  const next = () => {
+    let result = 0;
+    let shift = 0;
+    let b;
+    do {
+      b = encoded.charCodeAt(index++) - 63;
+      result |= (b & 0x1f) << shift;
+      shift += 5;
+    } while (b >= 0x20);
+    return result & 1 ? ~(result >> 1) : result >> 1;
+  };
+
+  while (index < encoded.length) {
+    lat += next();
+    lon += next();
+    points.push([lat * 1e-5, lon * 1e-5]);
+  }
+  return points;
+};
+
+// サーバーの geojson / polyline 形式のルートを [[lat, lon], ...] に変換
+const toLatLngs = (route) => {
+  if (!route) return [];
+  if (typeof route === 'string') return decodePolyline(route);
+  return route.coordinates.map(([lon, lat]) => [lat, lon]);
+};
+
+const markerColors = { start: 'red', end: 'green', waypoint: 'blue' };
+
+function RouteMap({ data }) {
+  const route = toLatLngs(data.route);
+  const baseRoute = toLatLngs(data.base_route);
+  const markers = data.markers || [];
+  const center = markers.length
+    ? [markers[0].lat, markers[0].lon]
+    : route[0] || [35.4675, 135.396];
+
+  return (
+    // center は初回描画時しか反映されないので、ルートが変わったら作り直す
+    <MapContainer
+      key={center.join(',')}
+      center={center}
+      zoom={14}
+      style={{ width: '100%', height: '100%' }}
+    >
+      <TileLayer
+        attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+        url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
+      />
+      {/* 寄り道経由地ありルート（青）と直行ルート（赤） */}
+      <Polyline
+        positions={route}
+        pathOptions={{ color: 'blue', weight: 4, opacity: 0.7 }}
+      />
+      <Polyline
+        positions={baseRoute}
+        pathOptions={{ color: 'red', weight: 3, opacity: 0.8 }}
+      />
+      {markers.map((m, i) => (
+        <CircleMarker
+          key={i}
+          center={[m.lat, m.lon]}
+          radius={8}
+          pathOptions={{ color: markerColors[m.kind] || 'blue' }}
+        >
+          <Tooltip>{m.label}</Tooltip>
+          {m.name && (
+            <Popup>
+              {m.name}
+              {m.tag ? `（${m.tag}）` : ''}
+            </Popup>
+          )}
+        </CircleMarker>
+      ))}
+    </MapContainer>
+  );
+}
+
+export default RouteMap;